@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    \mainpage
+
+    \section Infos
+
+     Written by François Bianco, University of Geneva - francois.bianco@unige.ch
+
+     Headless acquisition of the controllers, to run on a computer without
+     display. The samples are written to a row format file which can be
+     opened in labmonitoring.py or plotted with generatePlots.py.
+
+    \section Copyright
+
+    Copyright (C) 2013 François Bianco, University of Geneva - francois.bianco@unige.ch
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+import sys
+import socket
+from optparse import OptionParser
+import serial
+
+from controllers import config
+from controllers.engine import Engine
+from controllers.streaming import DEFAULT_PORT
+from controllers import metrics
+
+def main() :
+    """Allow to use this script as a *nix command line program."""
+
+    parser = OptionParser(usage="usage: %prog [options]")
+    parser.add_option("-s", "--setup", default=config.DEFAULT_SETUP, dest="setup",
+        help="Lab setup to read, one of %s [default: %%default]" % ', '.join(sorted(config.SETUPS)))
+    parser.add_option("-i", "--interval", type="float", default=1, dest="interval",
+        help="Readout interval in minutes, the longest one with --min-interval [default: %default]")
+    parser.add_option("-m", "--min-interval", type="float", default=None, dest="minInterval",
+        help="Adapt the readout interval of each channel to the changes of its value, down to this interval in seconds")
+    parser.add_option("-t", "--tolerance", type="float", default=1, dest="tolerance",
+        help="Relative change between two samples in %, the readout is faster above it and slower below [default: %default]")
+    parser.add_option("-o", "--output", default=None, dest="filename",
+        help="File where the samples are appended [default: bakeout_<date>.csv]")
+    parser.add_option("-b", "--binary", action="store_true", default=False, dest="binary",
+        help="Also write a memory mapped binary log, <output>_<channel>.bin")
+    parser.add_option("-r", "--rollups", action="store_true", default=False, dest="rollups",
+        help="Also write the min, max and mean by minute, 10 minutes and hour, <output>_<channel>.<s>s.rollup")
+    parser.add_option("-p", "--stream-port", type="int", default=None, dest="streamPort",
+        help="Publish the samples to the local programs on this TCP port, e.g. %i" % DEFAULT_PORT)
+    parser.add_option("--metrics-port", type="int", default=None, dest="metricsPort",
+        help="Serve the I/O metrics of the devices on this local HTTP port, e.g. %i" % metrics.DEFAULT_PORT)
+    parser.add_option("--simulate", action="store_true", default=False, dest="simulate",
+        help="Read simulated controllers instead of the instruments (Linux only)")
+    parser.add_option("--gauges", type="int", default=0, dest="gauges",
+        help="Simulate this number of daisy chained IGC3 gauges instead of the setup")
+    parser.add_option("--latency", type="float", default=0.005, dest="latency",
+        help="Reply latency of the simulated controllers in seconds [default: %default]")
+    parser.add_option("--jitter", type="float", default=0, dest="jitter",
+        help="Random additional latency in seconds [default: %default]")
+    parser.add_option("--drop", type="float", default=0, dest="dropRate",
+        help="Probability of a dropped reply [default: %default]")
+    parser.add_option("--corrupt", type="float", default=0, dest="corruptRate",
+        help="Probability of a corrupted reply [default: %default]")
+    parser.add_option("-q", "--quiet", action="store_true", default=False, dest="quiet", help="Be quiet")
+    (options, args) = parser.parse_args()
+
+    if options.setup not in config.SETUPS :
+        parser.error("Unknown setup %s" % options.setup)
+
+    setup = options.setup
+    if options.simulate or options.gauges :
+        from controllers import simulators
+
+        if options.gauges :
+            setup = simulators.addGaugesSetup( options.gauges )
+
+        setup, sims = simulators.simulate( setup, latency = options.latency,
+            jitter = options.jitter, dropRate = options.dropRate,
+            corruptRate = options.corruptRate )
+
+    try :
+        engine = Engine( setup, options.filename, options.quiet, options.binary, options.rollups,
+            options.streamPort, options.metricsPort )
+    except socket.error :
+        print "Cannot open the local port : %s" % sys.exc_info()[1]
+        sys.exit(1)
+
+    try :
+        engine.run( options.interval * 60, minInterval = options.minInterval,
+            tolerance = options.tolerance / 100. )
+    except serial.SerialException :
+        print "Serial connection error : %s" % sys.exc_info()[1]
+        sys.exit(1)
+
+if __name__ == "__main__":
+    try :
+        main()
+    except (KeyboardInterrupt) :
+        print "Goodbye world !"
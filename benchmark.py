@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    \mainpage
+
+    \section Infos
+
+     Written by François Bianco, University of Geneva - francois.bianco@unige.ch
+
+     Benchmarks of the hot paths, on simulated controllers and synthetic
+     data, to compare the versions of the program :
+
+     - acquisition : samples per second read through the drivers and the
+       acquisition workers, from the simulated controllers (Linux only)
+     - replot : time of Plot.refresh() versus the length of the history
+     - save : time of BakeoutControllerWindow.save() and of the autosave
+       versus the length of the history
+     - generate : time and peak memory of generatePlots.generatePlot per MB
+       of input file
+
+     The Qt benchmarks need a display, e.g. run them in xvfb-run on a
+     server. The results are written as JSON.
+
+    \section Copyright
+
+    Copyright (C) 2013 François Bianco, University of Geneva - francois.bianco@unige.ch
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+import os
+import sys
+import time
+import json
+import shutil
+import platform
+import tempfile
+import subprocess
+from optparse import OptionParser
+
+import numpy
+
+SECTIONS = [ 'acquisition', 'replot', 'save', 'generate' ]
+
+def history( n, seed = 0 ) :
+    """Return synthetic times and pressures of n samples, every 10 s up to now."""
+
+    r = numpy.random.RandomState( seed )
+    x = time.time() - 10. * numpy.arange( n )[ : : -1 ]
+    y = 10 ** ( -9 + numpy.cumsum( r.normal( 0, 0.01, n ) ) )
+    return x, y
+
+
+def best( f, repeat = 3 ) :
+    """Return the best time of f() over repeat runs."""
+
+    times = []
+    for i in xrange( repeat ) :
+        start = time.time()
+        f()
+        times.append( time.time() - start )
+
+    return min( times )
+
+
+def benchAcquisition( options ) :
+    """Samples per second read from simulated controllers, polled without pause."""
+
+    from controllers import config, simulators
+    from controllers.acquisition import Acquisition
+
+    results = []
+
+    for gauges in options.gauges :
+        setup, sims = simulators.simulate( simulators.addGaugesSetup( gauges ), latency = 0 )
+        acquisition = Acquisition()
+        devices = config.makeDevices( setup )
+        for channel, device in devices :
+            device.connect()
+            acquisition.addDevice( channel, device )
+
+        acquisition.start( 0 )
+        time.sleep( options.duration )
+        acquisition.stop()
+        count = len( acquisition.samples() )
+
+        for channel, device in devices :
+            device.disconnect()
+        for s in sims :
+            s.stop()
+
+        results.append( { 'gauges' : gauges, 'seconds' : options.duration,
+            'samples' : count, 'samplesPerSecond' : count / options.duration } )
+
+    return results
+
+
+def application() :
+    """Return the QApplication, created once."""
+
+    from PyQt4 import Qt
+
+    app = Qt.QApplication.instance()
+    if app is None :
+        app = Qt.QApplication( sys.argv )
+    return app
+
+
+def benchReplot( options ) :
+    """Time of a plot refresh, painted in a pixmap, versus the history length."""
+
+    from PyQt4 import Qt
+    from controllers.plot import Plot
+
+    app = application()
+    plot = Plot()
+    plot.resize( 800, 300 )
+
+    results = []
+
+    for n in options.lengths :
+        x, y = history( n )
+        plot.initCurve()
+        plot.addSamples( x, y )
+
+        def refresh() :
+            plot.refresh()
+            Qt.QPixmap.grabWidget( plot )
+
+        results.append( { 'samples' : n, 'seconds' : best( refresh, options.repeat ) } )
+
+    return results
+
+
+def benchSave( options ) :
+    """Time of a full save and of an autosave versus the history length."""
+
+    from controllers import simulators
+    from controllers.storage import RowWriter
+    from labmonitoring import BakeoutControllerWindow
+
+    app = application()
+    setup, sims = simulators.simulate( 'LT-STM' )
+    window = BakeoutControllerWindow( setup )
+    directory = tempfile.mkdtemp()
+
+    results = []
+
+    try :
+        for n in options.lengths :
+            x, y = history( n )
+            for p in window.plots.values() :
+                p.initCurve()
+                p.addSamples( x, y )
+
+            filename = os.path.join( directory, 'save.csv' )
+            save = best( lambda : window.save( filename ), options.repeat )
+            size = os.path.getsize( filename )
+
+            # Autosave of one new sample per channel, after n samples
+            window.autoSaveWriters = [ RowWriter( os.path.join( directory, 'autosave%i.csv' % n ) ) ]
+            def autoSave() :
+                window.unsavedSamples = [ ( name, x[-1], y[-1] ) for name in window.plots ]
+                window.autoSave()
+            autosave = best( autoSave, options.repeat )
+            window.autoSaveWriters[0].close()
+            window.autoSaveWriters = []
+
+            results.append( { 'samples' : n, 'channels' : len( window.plots ),
+                'saveSeconds' : save, 'saveBytes' : size, 'autoSaveSeconds' : autosave } )
+    finally :
+        shutil.rmtree( directory )
+        for s in sims :
+            s.stop()
+
+    return results
+
+
+GENERATE_CHILD = """
+import sys, time, resource
+import matplotlib
+matplotlib.use('Agg')
+sys.path.insert(0, %r)
+import generatePlots
+start = time.time()
+generatePlots.generatePlot(%r)
+print time.time() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+"""
+
+def benchGenerate( options ) :
+    """Time and peak memory of generatePlot, in a new process for each file."""
+
+    directory = tempfile.mkdtemp()
+    here = os.path.dirname( os.path.abspath( __file__ ) )
+
+    results = []
+
+    try :
+        for n in options.lengths :
+            x, y = history( n )
+            filename = os.path.join( directory, 'bakeout%i.csv' % n )
+            f = open( filename, 'w' )
+            f.write( 'Time;' + ';'.join( map( repr, x ) ) + '\n' )
+            f.write( 'Temperature;' + ';'.join( map( repr, 20 + numpy.log10( y ) ) ) + '\n' )
+            f.write( 'Pressure;' + ';'.join( map( repr, y ) ) + '\n' )
+            f.close()
+
+            megabytes = os.path.getsize( filename ) / 1e6
+            output = subprocess.Popen( [ sys.executable, '-c', GENERATE_CHILD % ( here, filename ) ],
+                stdout = subprocess.PIPE ).communicate()[0]
+            seconds, maxrss = output.split()[-2:]
+
+            results.append( { 'samples' : n, 'megabytes' : megabytes,
+                'seconds' : float( seconds ), 'secondsPerMegabyte' : float( seconds ) / megabytes,
+                # ru_maxrss is in kB on Linux
+                'peakMegabytes' : int( maxrss ) / 1e3 } )
+    finally :
+        shutil.rmtree( directory )
+
+    return results
+
+
+def main() :
+    """Allow to use this script as a *nix command line program."""
+
+    parser = OptionParser(usage="usage: %prog [options] [section(s)]\n\nsections: " + ', '.join( SECTIONS ))
+    parser.add_option("-o", "--output", default="benchmark.json", dest="output",
+        help="JSON file where the results are written [default: %default]")
+    parser.add_option("-l", "--lengths", default="1000,10000,100000,1000000", dest="lengths",
+        help="History lengths, comma separated [default: %default]")
+    parser.add_option("-g", "--gauges", default="1,8,32", dest="gauges",
+        help="Numbers of simulated gauges, comma separated [default: %default]")
+    parser.add_option("-d", "--duration", type="float", default=5, dest="duration",
+        help="Duration of each acquisition benchmark in seconds [default: %default]")
+    parser.add_option("-r", "--repeat", type="int", default=3, dest="repeat",
+        help="Repetitions of the timings, the best one is kept [default: %default]")
+    parser.add_option("-q", "--quiet", action="store_true", default=False, dest="quiet", help="Be quiet")
+    (options, args) = parser.parse_args()
+
+    options.lengths = map( int, options.lengths.split( ',' ) )
+    options.gauges = map( int, options.gauges.split( ',' ) )
+
+    sections = args or SECTIONS
+    for s in sections :
+        if s not in SECTIONS :
+            parser.error("Unknown section %s" % s)
+
+    results = {
+        'date' : time.strftime( '%Y-%m-%d %H:%M:%S' ),
+        'python' : platform.python_version(),
+        'platform' : platform.platform(),
+        'numpy' : numpy.__version__,
+    }
+
+    for s in sections :
+        if not options.quiet : print '--> Benchmarking ' + s,
+        sys.stdout.flush()
+
+        try :
+            results[s] = globals()[ 'bench' + s.capitalize() ]( options )
+        except ImportError as e :
+            # i.e. no Qt on this computer
+            results[s] = { 'skipped' : str( e ) }
+            if not options.quiet : print ' skipped : %s' % e
+            continue
+
+        if not options.quiet :
+            print ' finished'
+            for r in results[s] :
+                print '    ' + ', '.join( [ '%s %s' % ( k, v ) for k, v in sorted( r.items() ) ] )
+
+    f = open( options.output, 'w' )
+    json.dump( results, f, indent = 2, sort_keys = True )
+    f.close()
+
+if __name__ == "__main__":
+    try :
+        main()
+    except (KeyboardInterrupt) :
+        print "Goodbye world !"
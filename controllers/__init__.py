@@ -1,2 +1,2 @@
 # -*- coding: utf-8 -*-
-__all__ = ['plot','IGC3','Lakeshore331','MVC3','TwickenhamHeDepth']
\ No newline at end of file
+# The controller modules are imported on demand, see config.controllerModule
@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# GPL v.3 see master file
+
+"""Read the devices in background threads, one per serial bus.
+
+    The samples are sent as (channel, time, value) tuples through a thread
+    safe Queue, the GUI or any other consumer collects them when it wants,
+    without ever waiting on the serial I/O.
+"""
+
+import threading
+import Queue
+import serial
+
+from clock import MasterClock
+
+DEBUG = False
+
+class AdaptiveRate( object ) :
+    """Polling interval of one channel, adapted to the changes of its value.
+
+        The interval is halved when the value changed by more than
+        tolerance (relative change) since the previous sample, and grows by
+        half when it changed by less than tolerance / 4, always within
+        [minInterval, maxInterval]. As the change between two samples grows
+        with the interval, the rate settles where the changes are about the
+        tolerance. With minInterval = maxInterval the rate is fixed.
+    """
+
+    def __init__( self, minInterval, maxInterval, tolerance = 0.01 ) :
+
+        self.minInterval = minInterval
+        self.maxInterval = maxInterval
+        self.tolerance = tolerance
+        # Fast at first, the first samples tell if the value is stable
+        self.interval = minInterval
+        self.last = None
+
+
+    def update( self, value ) :
+        """Take a new sample into account, return the interval to the next one."""
+
+        if value is None :
+            # Reading error, keep the rate
+            return self.interval
+
+        if self.last is not None :
+            change = abs( value - self.last ) / max( abs( value ), abs( self.last ), 1e-300 )
+            if change > self.tolerance :
+                self.interval = max( self.interval / 2., self.minInterval )
+            elif change < self.tolerance / 4. :
+                self.interval = min( self.interval * 1.5, self.maxInterval )
+
+        self.last = value
+        return self.interval
+
+
+class BusWorker( threading.Thread ) :
+    """Poll all the devices sharing one serial port, each at its own rate.
+
+        The worker is the only one talking on its bus, so the transactions
+        of daisy chained devices never overlap : the devices due at the
+        same time are queried back to back. The interval of each channel is
+        adapted by an AdaptiveRate between minInterval and interval, its
+        deadlines are the ticks of the MasterClock shared by all the
+        workers, and the samples are stamped by this clock. After
+        each batch, cycleTime is the time spent on the bus (in seconds) and
+        utilization the fraction of the shortest channel interval it
+        represents.
+    """
+
+    def __init__( self, queue, interval, name = '', minInterval = None, tolerance = 0.01, clock = None ) :
+        """BusWorker constructor, interval is the longest polling period in
+            seconds and minInterval the shortest, the same by default.
+        """
+
+        if clock is None :
+            clock = MasterClock()
+
+        threading.Thread.__init__( self )
+        self.setDaemon( True )
+
+        self.queue = queue
+        self.interval = interval
+        self.minInterval = interval if minInterval is None else min( minInterval, interval )
+        self.tolerance = tolerance
+        self.clock = clock
+        # Functions called with each sample from this thread, see Acquisition.addListener
+        self.listeners = []
+        self.name = name
+        self.devices = []
+        self.rates = {}
+        self.stopEvent = threading.Event()
+
+        self.cycles = 0
+        self.cycleTime = 0
+        self.utilization = 0
+        # Mean time of one transaction for each channel
+        self.transactionTime = {}
+
+
+    def addDevice( self, channel, device ) :
+        """Add a device to poll, its samples will be tagged with channel."""
+
+        self.devices.append( ( channel, device ) )
+        self.rates[channel] = AdaptiveRate( self.minInterval, self.interval, self.tolerance )
+
+
+    def intervals( self ) :
+        """Return the current polling interval of each channel, in seconds."""
+
+        return dict( [ ( channel, rate.interval ) for channel, rate in self.rates.items() ] )
+
+
+    def stop( self ) :
+        """Ask the thread to stop after the running query."""
+
+        self.stopEvent.set()
+
+
+    def run( self ) :
+
+        clock = self.clock
+        # All the channels are read at the first tick
+        nextPoll = dict( [ ( channel, clock.origin ) for channel, device in self.devices ] )
+
+        while not self.stopEvent.isSet() :
+
+            start = clock.now()
+
+            for channel, device in self.devices :
+                if nextPoll[channel] > start :
+                    continue
+                if self.stopEvent.isSet() :
+                    return
+
+                rate = self.rates[channel]
+                clock.record( nextPoll[channel], rate.interval )
+                rate.update( self.poll( channel, device ) )
+                # The next tick on the grid of the interval, the late ones are skipped
+                nextPoll[channel] = clock.nextDeadline( rate.interval )
+
+            self.cycles += 1
+            self.cycleTime = clock.now() - start
+            self.utilization = self.cycleTime / max( min( self.intervals().values() or [ self.interval ] ), 1e-6 )
+
+            self.stopEvent.wait( max( min( nextPoll.values() or [ clock.now() + self.interval ] ) - clock.now(), 0 ) )
+
+
+    def poll( self, channel, device ) :
+        """Read one value and send it with its time stamp, return the value
+            or None if it could not be read."""
+
+        start = self.clock.now()
+        t = self.clock.time( start )
+
+        try :
+            value = device.read()
+        except ( serial.SerialException, OSError ) as e :
+            print "Serial error on %s : %s" % ( channel, e )
+            return None
+
+        if value is not None :
+            self.queue.put( ( channel, t, value ) )
+            for listener in self.listeners :
+                listener( channel, t, value )
+
+        duration = self.clock.now() - start
+        mean = self.transactionTime.get( channel, duration )
+        self.transactionTime[channel] = 0.8 * mean + 0.2 * duration
+
+        if DEBUG:
+            print "%s : %s in %.3f s" % ( channel, value, duration )
+
+        return value
+
+
+class Acquisition( object ) :
+    """Group the devices by serial bus and run one BusWorker per bus."""
+
+    def __init__( self, queue = None ) :
+
+        if queue is None :
+            queue = Queue.Queue()
+
+        self.queue = queue
+        self.devices = []
+        self.workers = []
+        self.listeners = []
+        self.clock = MasterClock()
+
+
+    def addDevice( self, channel, device ) :
+        """Add a device to read, its samples will be tagged with channel."""
+
+        self.devices.append( ( channel, device ) )
+
+
+    def addListener( self, listener ) :
+        """Call listener( channel, time, value ) as soon as a sample is read.
+
+            The listener is called from the acquisition threads, it has to
+            be thread safe and fast, i.e. streaming.StreamServer.publish.
+        """
+
+        self.listeners.append( listener )
+
+
+    def start( self, interval, minInterval = None, tolerance = 0.01 ) :
+        """Start the workers, the devices have to be connected before.
+            interval is the polling period in seconds. If minInterval is
+            given, the period of each channel is adapted between minInterval
+            and interval to the relative changes of its value, see
+            AdaptiveRate.
+        """
+
+        self.stop()
+
+        # The ticks of all the buses are aligned on the same origin
+        self.clock = MasterClock()
+        buses = {}
+        for channel, device in self.devices :
+            port = device.initSerial()
+            bus = id( port )
+            if bus not in buses :
+                buses[bus] = BusWorker( self.queue, interval, str( getattr( port, 'port', bus ) ),
+                    minInterval, tolerance, self.clock )
+                buses[bus].listeners = self.listeners
+                self.workers.append( buses[bus] )
+            buses[bus].addDevice( channel, device )
+
+        for w in self.workers :
+            w.start()
+
+
+    def stop( self ) :
+        """Stop the workers and wait for their running query to finish."""
+
+        for w in self.workers :
+            w.stop()
+
+        for w in self.workers :
+            w.join()
+
+        self.workers = []
+
+
+    def busStatistics( self ) :
+        """Return (bus name, number of devices, cycle time, utilization) for each bus."""
+
+        return [ ( w.name, len( w.devices ), w.cycleTime, w.utilization )
+            for w in self.workers ]
+
+
+    def clockStatistics( self ) :
+        """Return (ticks, mean jitter, max jitter, missed deadlines) of the
+            running acquisition, see clock.MasterClock.statistics.
+        """
+
+        return self.clock.statistics()
+
+
+    def intervals( self ) :
+        """Return the current polling interval of each channel, in seconds."""
+
+        intervals = {}
+        for w in self.workers :
+            intervals.update( w.intervals() )
+
+        return intervals
+
+
+    def samples( self ) :
+        """Return all the samples received since the last call, never blocks."""
+
+        samples = []
+        try :
+            while True :
+                samples.append( self.queue.get_nowait() )
+        except Queue.Empty :
+            pass
+
+        return samples
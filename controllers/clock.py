@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# GPL v.3 see master file
+
+"""Master acquisition clock, shared by all the bus workers.
+
+    The deadlines are computed from the origin of a monotonic clock, never
+    by adding intervals to the previous poll time, so they do not drift and
+    the channels polled at the same interval are polled on the same ticks,
+    whatever their bus. The time stamps are the wall clock time at the
+    origin plus the monotonic time since the origin, thus not changed by an
+    adjustment of the system clock during a run.
+"""
+
+import sys
+import math
+import time
+import threading
+
+DEBUG = False
+
+# Value of CLOCK_MONOTONIC in the C library, it depends on the system
+CLOCK_MONOTONIC = { 'linux' : 1, 'darwin' : 6, 'freebsd' : 4 }
+
+def _makeMonotonic() :
+    """Return a monotonic clock in seconds, time.time if none is available."""
+
+    try :
+        import ctypes, ctypes.util
+
+        class timespec( ctypes.Structure ) :
+            _fields_ = [ ( 'tv_sec', ctypes.c_long ), ( 'tv_nsec', ctypes.c_long ) ]
+
+        librt = ctypes.CDLL( ctypes.util.find_library( 'rt' ) or ctypes.util.find_library( 'c' ), use_errno = True )
+        clock_gettime = librt.clock_gettime
+    except ( ImportError, OSError, AttributeError, TypeError ) :
+        # i.e. Windows
+        return time.time
+
+    clockId = [ i for name, i in CLOCK_MONOTONIC.items() if sys.platform.startswith( name ) ]
+    if not clockId :
+        return time.time
+    clockId = clockId[0]
+
+    def monotonic() :
+        t = timespec()
+        if clock_gettime( clockId, ctypes.byref( t ) ) != 0 :
+            raise OSError( ctypes.get_errno(), 'clock_gettime failed' )
+        return t.tv_sec + t.tv_nsec * 1e-9
+
+    # Checked once here, the acquisition threads could not recover from it
+    try :
+        monotonic()
+    except OSError :
+        return time.time
+
+    return monotonic
+
+monotonic = _makeMonotonic()
+
+
+class MasterClock( object ) :
+    """Drift free ticks of the acquisition, with the statistics of their jitter.
+
+        The jitter of a poll is its delay after its deadline. A deadline is
+        missed when the poll is so late that the next one has already
+        passed.
+    """
+
+    def __init__( self ) :
+
+        self.origin = monotonic()
+        self.wallOrigin = time.time()
+
+        self.lock = threading.Lock()
+        self.ticks = 0
+        self.missed = 0
+        self.jitterSum = 0.
+        self.maxJitter = 0.
+        self.lastJitter = 0.
+
+
+    def now( self ) :
+        """Return the monotonic time, in seconds."""
+
+        return monotonic()
+
+
+    def time( self, t = None ) :
+        """Return the time stamp of the monotonic time t, now by default."""
+
+        if t is None :
+            t = monotonic()
+        return self.wallOrigin + t - self.origin
+
+
+    def nextDeadline( self, interval ) :
+        """Return the first tick of the interval grid after now."""
+
+        interval = max( interval, 1e-6 )
+        return self.origin + ( math.floor( ( monotonic() - self.origin ) / interval ) + 1 ) * interval
+
+
+    def record( self, deadline, interval ) :
+        """Account for a poll of the given deadline starting now."""
+
+        jitter = max( monotonic() - deadline, 0 )
+
+        with self.lock :
+            self.ticks += 1
+            self.jitterSum += jitter
+            self.maxJitter = max( self.maxJitter, jitter )
+            self.lastJitter = jitter
+            # Polls as fast as possible, i.e. interval 0, have no deadline to miss
+            if interval > 0 and jitter >= interval :
+                self.missed += int( jitter / interval )
+
+        if DEBUG and interval > 0 and jitter >= interval :
+            print "Deadline missed by %.3f s" % jitter
+
+
+    def statistics( self ) :
+        """Return (ticks, mean jitter, max jitter, missed deadlines), jitters in seconds."""
+
+        with self.lock :
+            return ( self.ticks, self.jitterSum / max( self.ticks, 1 ),
+                self.maxJitter, self.missed )
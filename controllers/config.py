@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# GPL v.3 see master file
+
+"""Controllers configuration of the lab setups.
+
+    Each setup is a list of channels. A channel gives the controller type,
+    one of CONTROLLERS, and the arguments of its constructor. 'bus' names a previous channel whose
+    serial port is shared, i.e. for daisy chained IGC3. 'deviceName' is
+    only used by the plots.
+
+    On Windows it seems that the port 0 is unused, or it might depends on
+    our own configuration.
+"""
+
+import sys
+import time
+
+DEFAULT_SETUP = 'LT-STM'
+
+# Controller types : module of the plot in controllers and class of the
+# driver in devices. A plot module, and the drivers with it, is only
+# imported by controllerModule when a setup uses it.
+CONTROLLERS = {
+    'IGC3' : ( 'controllers.IGC3', 'IGC3' ),
+    'Lakeshore331' : ( 'controllers.Lakeshore331', 'Lakeshore331' ),
+    'MVC3' : ( 'controllers.MVC3', 'MVC3' ),
+    'TwickenhamHeDepth' : ( 'controllers.TwickenhamHeDepth', 'TwickenhamHeDepth' ),
+}
+
+# Time spent to import each plot module, in seconds, see controllerModule
+IMPORT_TIMES = {}
+
+SETUPS = {
+
+    # NOTE This is a special case for our Omicron STM lab, as exemple
+    'LT-STM' : [
+        { 'channel' : 'Temperature', 'type' : 'Lakeshore331', 'serialPort' : 'COM15' },
+        { 'channel' : 'Pressure LT', 'type' : 'IGC3', 'deviceAddress' : '\x01',
+            'deviceName' : 'LT', 'serialPort' : 'COM14' },
+        { 'channel' : 'Pressure Prep', 'type' : 'IGC3', 'deviceAddress' : '\x02',
+            'deviceName' : 'Prep', 'bus' : 'Pressure LT' },
+    ],
+
+    # NOTE This is a special case for our JT-STM lab, as exemple
+    'JT-STM' : [
+        { 'channel' : 'Pressure JT', 'type' : 'MVC3', 'deviceName' : 'JT', 'serialPort' : 1 },
+    ],
+
+    # NOTE This is an example to use this program with a LHe meter, as exemple
+    'LHeMeter' : [
+        { 'channel' : 'Liquid Helium Depth', 'type' : 'TwickenhamHeDepth', 'serialPort' : 1 },
+    ],
+}
+
+
+def arguments( channel, keepName = False ) :
+    """Return the constructor arguments of a channel configuration."""
+
+    args = dict( channel )
+    for key in ( 'channel', 'type', 'bus' ) :
+        args.pop( key, None )
+
+    if not keepName :
+        args.pop( 'deviceName', None )
+
+    return args
+
+
+def controllerModule( controllerType ) :
+    """Return the plot module of a controller type, imported on first use."""
+
+    if controllerType not in CONTROLLERS :
+        raise KeyError( 'Unknown controller type %s' % controllerType )
+
+    name = CONTROLLERS[controllerType][0]
+    if name not in sys.modules :
+        start = time.time()
+        __import__( name )
+        IMPORT_TIMES[controllerType] = time.time() - start
+
+    return sys.modules[name]
+
+
+def deviceClass( controllerType ) :
+    """Return the driver class of a controller type."""
+
+    if controllerType not in CONTROLLERS :
+        raise KeyError( 'Unknown controller type %s' % controllerType )
+
+    # Imported with serial on first use, as the plot modules
+    import devices
+    return getattr( devices, CONTROLLERS[controllerType][1] )
+
+
+def makeDevices( setup = DEFAULT_SETUP ) :
+    """Create the devices of a setup, return a list of (channel, device).
+
+        The serial ports shared on a bus are created, thus opened, here.
+    """
+
+    if setup not in SETUPS :
+        raise KeyError( 'Unknown setup %s' % setup )
+
+    made = []
+    byChannel = {}
+    for c in SETUPS[setup] :
+        args = arguments( c )
+        if 'bus' in c :
+            args['serial'] = byChannel[ c['bus'] ].initSerial()
+
+        device = deviceClass( c['type'] )( **args )
+        byChannel[ c['channel'] ] = device
+        made.append( ( c['channel'], device ) )
+
+    return made
@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# GPL v.3 see master file
+
+"""Serial protocols of the controllers, without any GUI.
+
+    Each device knows how to open its serial port and how to query one value
+    with read(). They are used by the acquisition workers, the plots only
+    display the values. The transactions are counted in metrics, see
+    metrics.DeviceMetrics.
+"""
+
+import time
+from struct import unpack
+import serial
+
+from modbusCRC16 import modbusCRC16, checkCRC16
+from metrics import DeviceMetrics
+
+DEBUG = False
+
+class SerialDevice( object ) :
+    """Base class for a controller connected on a serial port.
+
+        Several devices can share the same serial object when they are
+        daisy chained on the same bus.
+
+        A driver defines makeSerial(), which returns a new serial object
+        with the settings of its controller, and read(), which queries the
+        controller and returns the value read, or None.
+    """
+
+    def __init__( self, serialPort = 0, serial = None ) :
+        self.serial = serial
+        self.serialPort = serialPort
+        self.metrics = DeviceMetrics()
+
+
+    def initSerial( self ) :
+        """Create the serial port object only if not already existing,
+        i.e. it was already created by a device on the same bus."""
+
+        if not self.serial :
+            self.serial = self.makeSerial()
+
+        return self.serial
+
+
+    def connect( self ) :
+        """Connect and open the serial port."""
+
+        if DEBUG:
+            print "connecting"
+
+        self.initSerial()
+
+        if not self.serial.isOpen() :
+            self.serial.open()
+
+        return self.serial
+
+
+    def disconnect( self ) :
+        """Safe way to close the serial port."""
+
+        if not self.serial :
+            return
+
+        if self.serial.isOpen() :
+            if DEBUG:
+                print "disconnecting"
+            self.serial.close()
+
+
+    def send( self, msg ) :
+        """Write msg on the serial port."""
+
+        self.serial.write( msg )
+        self.metrics.bytesSent += len( msg )
+
+
+    def receive( self, size = None ) :
+        """Read size bytes, or a line if size is None, from the serial port.
+
+            A short reply means that the serial timeout elapsed.
+        """
+
+        if size is None :
+            reply = self.serial.readline()
+            complete = reply.endswith( '\n' )
+        else :
+            reply = self.serial.read( size )
+            complete = len( reply ) == size
+
+        self.metrics.bytesReceived += len( reply )
+        if not complete :
+            self.metrics.timeouts += 1
+            if not reply :
+                self.metrics.emptyReplies += 1
+
+        return reply
+
+
+    def transaction( self, msg, size = None ) :
+        """Send a query and return its reply, see receive, counting its round trip time."""
+
+        self.metrics.queries += 1
+        start = time.time()
+
+        self.send( msg )
+        reply = self.receive( size )
+
+        self.metrics.observe( time.time() - start )
+        return reply
+
+
+    def failed( self, message ) :
+        """Count a read without value."""
+
+        self.metrics.failures += 1
+        print message
+
+
+    def parseFailed( self, reply, message ) :
+        """Count a read without value because of a bad reply, a timeout is
+            already counted by receive."""
+
+        if reply :
+            self.metrics.parseErrors += 1
+        self.failed( message )
+
+
+class IGC3( SerialDevice ) :
+    """IGC3 pressure controller, talking Modbus on a RS-485 bus.
+
+        The replies are checked with their CRC, a bad or missing reply is
+        asked again, after RETRY_PAUSE, until retryTime seconds are elapsed.
+    """
+
+    # Address, function, number of bytes, 4 bytes float, CRC
+    REPLY_SIZE = 9
+
+    # Seconds between two queries, the end of a garbled reply can still come
+    # and a busy controller should not be flooded
+    RETRY_PAUSE = 0.05
+
+    def __init__( self, deviceAddress, serialPort = 0, serial = None, retryTime = 3 ) :
+
+        SerialDevice.__init__( self, serialPort, serial )
+
+        # Device address 0x01, 0x02, ... (hex)
+        self.address = deviceAddress
+        self.initMsg( deviceAddress )
+
+        self.retryTime = retryTime
+
+
+    def initMsg( self, address ) :
+        """Generate the message for the IGC3 according to modbus protocol."""
+
+        # Query Message to IGC3 with MODBUS protocol
+        #
+        # Device address : 0x01, to 0x99
+        # Function code for IGC3 : 0x17
+        # Parameter to be read (in this case the pressure value ) : 0x00 0x9a
+        # Number of word (=2 Bytes) to read : 0x00 0x02
+        # Five words with only zeros to say that no parameters have to be written
+        #
+        # And then the two CRC bytes
+        #
+        self.queryMsg = address
+        self.queryMsg += "\x17\x00\x9a\x00\x02\x00\x00\x00\x00\x00"
+        queryMsgCRC = modbusCRC16( self.queryMsg )
+        self.queryMsg += chr( queryMsgCRC % 0x0100 )    # append the lowest byte of the CRC to the msg
+        self.queryMsg += chr( queryMsgCRC >> 8 )    # append the upper byte of the CRC to the msg
+
+
+    def makeSerial( self ) :
+        return serial.Serial( self.serialPort, 19200, serial.EIGHTBITS,
+                serial.PARITY_NONE, serial.STOPBITS_ONE, 1 )
+
+
+    def read( self ) :
+        """Read the pressure, None if no valid reply came in time."""
+
+        deadline = time.time() + self.retryTime
+
+        while True :
+            reply = self.query()
+
+            if reply is not None :
+                return unpack('f', reply[3:7] )[0] # Convert char 3 to 6 to a float (f)
+
+            if time.time() >= deadline :
+                self.failed( "Reading error on the pressure controller." )
+                return None
+
+            self.metrics.retries += 1
+            time.sleep( min( self.RETRY_PAUSE, max( deadline - time.time(), 0 ) ) )
+
+
+    def query( self ) :
+        """Send the query once, return the reply if it is valid, else None."""
+
+        # The bus is only used by one worker, so anything waiting is a late
+        # reply from a previous timed out query
+        self.serial.flushInput()
+
+        reply = self.transaction( self.queryMsg, self.REPLY_SIZE )
+
+        if len( reply ) != self.REPLY_SIZE :
+            # Empty or short, already counted as a timeout by receive
+            return None
+
+        if reply[0] != self.address or reply[1] != '\x17' or not checkCRC16( reply ) :
+            self.metrics.crcErrors += 1
+            if DEBUG:
+                print "Bad reply from IGC3 %r : %r" % ( self.address, reply )
+            return None
+
+        return reply
+
+
+class Lakeshore331( SerialDevice ) :
+    """LakeShore 331 temperature controller."""
+
+    def makeSerial( self ) :
+        return serial.Serial( self.serialPort, 9600, serial.SEVENBITS,
+                serial.PARITY_ODD, serial.STOPBITS_ONE, 1 )
+
+
+    def read( self ) :
+        """Read the temperature in Celsius."""
+
+        # Query message :
+        #     CRDG = Celsius Reading Query
+        #     A is the input can be A or B
+        #     Terminators are <CR><LF>
+        reply = self.transaction( "CRDG? A \r\n" )
+
+        try :
+            return float(reply)
+        except ValueError :
+            self.parseFailed( reply, "Reading error on the temperature controller." )
+            return None
+
+
+class MVC3( SerialDevice ) :
+    """MVC-3 pressure controller."""
+
+    def __init__( self, deviceAddress = None, deviceChannel = 1, serialPort = 0, serial = None ) :
+
+        SerialDevice.__init__( self, serialPort, serial )
+
+        """
+        MVC-3 Manual p. 51
+        Address <,> Command <CR>
+        Address <,> <TAB>   Command <,> <TAB>   [Parameter] <CR>
+
+        RPV[a]<CR>
+        b[,][TAB]x.xxxxE±xx
+        """
+
+        self.queryMsg = ''
+        # Device adress only needed for RS485
+        if (not deviceAddress == None):
+            self.queryMsg += deviceAddress + ','
+
+        self.queryMsg += "RPV"
+        self.queryMsg += str(deviceChannel) # [a] = 1,2,3 for channel number
+        self.queryMsg += '\r'
+
+
+    def makeSerial( self ) :
+        return serial.Serial( self.serialPort, 19200, serial.EIGHTBITS,
+                serial.PARITY_NONE, serial.STOPBITS_ONE, 1 )
+
+
+    def read( self ) :
+        """Read the pressure, None if the status is not OK."""
+
+        reply = self.transaction( self.queryMsg )
+
+        # Check status
+        #0   =   Measuring   value   OK
+        #1   =   Measuring   value   <   Measuring   range
+        #2   =   Measuring   value   >   Measuring   range
+        #3   =   Measuring   range   undershooting   (Err    Lo)
+        #4   =   Measuring   range   overstepping    (Err    Hi)
+        #5   =   Sensor  off (oFF)
+        #6   =   HV  on  (HU on)
+        #7   =   Sensor  error   (Err    S)
+        #8   =   BA  error   (Err    bA)
+        #9   =   No  Sensor  (no Sen)
+        #10  =   No  switch  on  or  switch  off point   (notriG)
+        #11  =   Pressure    value   overstepping    (   Err P)
+        #12  =   Pirani  error   ATMION  (Err    Pi)
+        #13  =   Breakdown   of  operational voltage (Err    24)
+        #14  =   Filament    defectively (FiLbr)
+
+        try :
+            fields = reply.split(',')
+            status = int(fields[0])
+
+            if (status == 0):
+                return float(fields[1])
+
+        except (ValueError, IndexError) :
+            self.parseFailed( reply, "Reading error on the pressure controller." )
+            return None
+
+        self.metrics.failures += 1
+        return None
+
+
+class TwickenhamHeDepth( SerialDevice ) :
+    """Twickenham Scientific Instrument He Depth Indicator."""
+
+    def makeSerial( self ) :
+        return serial.Serial( self.serialPort, 9600, serial.EIGHTBITS,
+                serial.PARITY_NONE, serial.STOPBITS_ONE, 1, xonxoff=True )
+
+
+    def read( self ) :
+        """Read the LHe level in mm."""
+
+        # Query message :
+        #     T = Trigger a reading, no read back
+        #     G return current reading : as abcdefg
+        #       a = channel A, B
+        #       fg = [mm]
+        #       where cdef are the LHe Level
+        #     Terminators are <CR><LF>
+        self.send( "T \r\n" )
+        reply = self.transaction( "G \r\n" )
+
+        try :
+            return float(reply[2:5])
+        except ValueError :
+            self.parseFailed( reply, "Reading error on the LHe level meter." )
+            return None
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# GPL v.3 see master file
+
+"""Headless acquisition, without Qt.
+
+    The devices of a setup are polled by the acquisition workers and all
+    the samples are written to a row format file by one main loop.
+"""
+
+import os
+import time
+import serial
+
+import config
+from acquisition import Acquisition
+from storage import RowWriter, BinaryWriter, RollupWriter
+from streaming import StreamServer
+from metrics import MetricsServer
+
+DEBUG = False
+
+class Engine( object ) :
+    """Run the acquisition of a setup and stream the samples to a file."""
+
+    def __init__( self, setup = config.DEFAULT_SETUP, filename = None, quiet = True, binary = False, rollups = False,
+            streamPort = None, metricsPort = None ) :
+
+        if filename is None :
+            filename = 'bakeout_' + time.strftime('%Y-%m-%d-%H-%M',time.localtime()) + '.csv'
+
+        self.filename = filename
+        self.quiet = quiet
+        self.binary = binary
+        self.rollups = rollups
+        self.running = False
+
+        self.devices = config.makeDevices( setup )
+        self.acquisition = Acquisition()
+        for channel, device in self.devices :
+            self.acquisition.addDevice( channel, device )
+
+        # Live samples for the other programs, see streaming.py
+        self.stream = None
+        if streamPort is not None :
+            self.stream = StreamServer( streamPort )
+            self.acquisition.addListener( self.stream.publish )
+
+        # I/O metrics of the devices, see metrics.py
+        self.metricsServer = None
+        if metricsPort is not None :
+            self.metricsServer = MetricsServer( self.devices, metricsPort )
+
+
+    def connect( self ) :
+        """Open all the serial ports, close them all if one fails."""
+
+        try :
+            for channel, device in self.devices :
+                device.connect()
+        except serial.SerialException :
+            self.disconnect()
+            raise
+
+
+    def disconnect( self ) :
+
+        for channel, device in self.devices :
+            device.disconnect()
+
+
+    def run( self, interval, flushInterval = 1, minInterval = None, tolerance = 0.01 ) :
+        """Poll the devices every interval seconds until stop() is called,
+            the samples are written every flushInterval seconds. With
+            minInterval, the polling rates are adapted to the changes of
+            the values, see acquisition.AdaptiveRate.
+        """
+
+        self.connect()
+        writers = [ RowWriter( self.filename ) ]
+        if self.binary :
+            writers.append( BinaryWriter( os.path.splitext( self.filename )[0] ) )
+        if self.rollups :
+            writers.append( RollupWriter( os.path.splitext( self.filename )[0] ) )
+
+        if self.stream is not None and not self.stream.isAlive() :
+            self.stream.start()
+            if not self.quiet : print 'Streaming samples on %s:%i' % self.stream.address
+
+        if self.metricsServer is not None and not self.metricsServer.isAlive() :
+            self.metricsServer.start()
+            if not self.quiet : print 'Serving metrics on http://%s:%i/metrics' % self.metricsServer.address
+
+        self.acquisition.start( interval, minInterval, tolerance )
+        self.running = True
+
+        if not self.quiet : print 'Writing samples to ' + self.filename
+
+        try :
+            while self.running :
+                time.sleep( flushInterval )
+                self.flush( writers )
+        finally :
+            self.acquisition.stop()
+            self.flush( writers )
+            if not self.quiet :
+                print '%i polls, jitter %.1f ms mean, %.1f ms max, %i missed deadline(s)' % self.statistics()
+            for w in writers :
+                w.close()
+            self.disconnect()
+
+
+    def flush( self, writers ) :
+        """Write the samples received since the last flush."""
+
+        samples = self.acquisition.samples()
+        if not samples :
+            return
+
+        for w in writers :
+            w.write( samples )
+
+        if not self.quiet :
+            for channel, t, value in samples :
+                print '%s  %-20s %g' % ( time.strftime('%H:%M:%S', time.localtime(t)), channel, value )
+
+
+    def statistics( self ) :
+        """Return (polls, mean jitter in ms, max jitter in ms, missed deadlines)."""
+
+        ticks, mean, maximum, missed = self.acquisition.clockStatistics()
+        return ticks, mean * 1e3, maximum * 1e3, missed
+
+
+    def stop( self ) :
+        """Stop the main loop, can be called from another thread."""
+
+        self.running = False
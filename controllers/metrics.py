@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# GPL v.3 see master file
+
+"""I/O metrics of the devices, to diagnose a failing controller.
+
+    Each devices.SerialDevice counts its transactions in a DeviceMetrics :
+    round trip latency histogram, timeouts, empty replies, retries, CRC and
+    parse failures and bytes on the wire. exposition() formats the metrics
+    of the devices as text in the Prometheus format, which MetricsServer
+    serves on a local HTTP port for the monitoring tools.
+"""
+
+import threading
+import BaseHTTPServer
+
+DEBUG = False
+
+DEFAULT_PORT = 50201
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = ( 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5 )
+
+# Counters of DeviceMetrics, with their help text
+COUNTERS = [
+    ( 'queries', 'Queries sent to the device' ),
+    ( 'failures', 'Reads which did not return a value' ),
+    ( 'timeouts', 'Replies not complete before the serial timeout' ),
+    ( 'emptyReplies', 'Timeouts without any byte received' ),
+    ( 'retries', 'Queries sent again after a bad reply' ),
+    ( 'crcErrors', 'Replies with a bad CRC or frame' ),
+    ( 'parseErrors', 'Replies which could not be converted to a value' ),
+    ( 'bytesSent', 'Bytes written to the serial port' ),
+    ( 'bytesReceived', 'Bytes read from the serial port' ),
+]
+
+class DeviceMetrics( object ) :
+    """Counters and round trip latency histogram of one device.
+
+        The counters are only changed by the thread polling the device, the
+        other threads read them.
+    """
+
+    def __init__( self ) :
+
+        self.reset()
+
+
+    def reset( self ) :
+
+        for name, text in COUNTERS :
+            setattr( self, name, 0 )
+
+        # Count of the latencies <= each bound of LATENCY_BUCKETS, and above
+        self.latencyCounts = [ 0 ] * ( len( LATENCY_BUCKETS ) + 1 )
+        self.latencySum = 0.
+        self.lastLatency = 0.
+
+
+    def observe( self, latency ) :
+        """Add the round trip time of a transaction, in seconds."""
+
+        i = 0
+        while i < len( LATENCY_BUCKETS ) and latency > LATENCY_BUCKETS[i] :
+            i += 1
+        self.latencyCounts[i] += 1
+        self.latencySum += latency
+        self.lastLatency = latency
+
+
+    def latencyQuantile( self, q ) :
+        """Return the upper bound of the bucket of the q quantile of the
+            latencies, None if there are none."""
+
+        total = sum( self.latencyCounts )
+        if total == 0 :
+            return None
+
+        count = 0
+        for i, n in enumerate( self.latencyCounts ) :
+            count += n
+            if count >= q * total :
+                return LATENCY_BUCKETS[i] if i < len( LATENCY_BUCKETS ) else float( 'inf' )
+
+
+    def meanLatency( self ) :
+
+        total = sum( self.latencyCounts )
+        return self.latencySum / total if total else None
+
+
+def _name( counter ) :
+    """Return the exposition name of a counter, i.e. bytesSent -> bytes_sent."""
+
+    return ''.join( [ '_' + c.lower() if c.isupper() else c for c in counter ] )
+
+
+def _labels( channel, device ) :
+
+    channel = channel.replace( '\\', '\\\\' ).replace( '"', '\\"' )
+    return 'channel="%s",type="%s"' % ( channel, device.__class__.__name__ )
+
+
+def exposition( devices ) :
+    """Return the metrics of the (channel, device) list in the Prometheus text format."""
+
+    lines = []
+
+    for counter, text in COUNTERS :
+        name = 'labmonitoring_device_%s_total' % _name( counter )
+        lines.append( '# HELP %s %s.' % ( name, text ) )
+        lines.append( '# TYPE %s counter' % name )
+        for channel, device in devices :
+            lines.append( '%s{%s} %i' % ( name, _labels( channel, device ), getattr( device.metrics, counter ) ) )
+
+    name = 'labmonitoring_device_latency_seconds'
+    lines.append( '# HELP %s Round trip time of the transactions.' % name )
+    lines.append( '# TYPE %s histogram' % name )
+    for channel, device in devices :
+        m = device.metrics
+        labels = _labels( channel, device )
+        counts = list( m.latencyCounts )
+        count = 0
+        for bound, n in zip( LATENCY_BUCKETS + ( '+Inf', ), counts ) :
+            count += n
+            lines.append( '%s_bucket{%s,le="%s"} %i' % ( name, labels, bound, count ) )
+        lines.append( '%s_sum{%s} %r' % ( name, labels, m.latencySum ) )
+        lines.append( '%s_count{%s} %i' % ( name, labels, count ) )
+
+    return '\n'.join( lines ) + '\n'
+
+
+class MetricsHandler( BaseHTTPServer.BaseHTTPRequestHandler ) :
+
+    def do_GET( self ) :
+
+        if self.path.split( '?' )[0] not in ( '/', '/metrics' ) :
+            self.send_error( 404 )
+            return
+
+        body = exposition( self.server.devices )
+        self.send_response( 200 )
+        self.send_header( 'Content-Type', 'text/plain; version=0.0.4' )
+        self.send_header( 'Content-Length', str( len( body ) ) )
+        self.end_headers()
+        self.wfile.write( body )
+
+
+    def log_message( self, *args ) :
+
+        if DEBUG:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message( self, *args )
+
+
+class MetricsServer( threading.Thread ) :
+    """Serve the metrics of the devices on http://host:port/metrics."""
+
+    def __init__( self, devices, port = DEFAULT_PORT, host = '127.0.0.1' ) :
+
+        threading.Thread.__init__( self )
+        self.setDaemon( True )
+
+        self.server = BaseHTTPServer.HTTPServer( ( host, port ), MetricsHandler )
+        self.server.devices = devices
+        self.address = self.server.server_address
+
+
+    def run( self ) :
+
+        self.server.serve_forever()
+
+
+    def stop( self ) :
+
+        self.server.shutdown()
+        self.server.server_close()
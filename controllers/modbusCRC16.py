@@ -1,13 +1,30 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-def modbusCRC16( st ) :
-	crc = 0xFFFF
-	for ch in st :
-		crc ^= ord( ch ) # convert char to int
+def _makeTable() :
+	"""CRC of every byte value, to process the messages byte by byte."""
+	table = []
+	for byte in range( 256 ) :
+		crc = byte
 		for i in range( 8 ) :
 			carry = crc & 0x0001
 			crc >>= 1
 			if ( carry ) :
 				crc ^= 0xA001
-	return crc
\ No newline at end of file
+		table.append( crc )
+	return table
+
+CRC16_TABLE = _makeTable()
+
+def modbusCRC16( st, crc = 0xFFFF ) :
+	"""Return the CRC of st, crc allows to continue the CRC of a previous part."""
+	table = CRC16_TABLE
+	for ch in st :
+		crc = ( crc >> 8 ) ^ table[ ( crc ^ ord( ch ) ) & 0xFF ]
+	return crc
+
+def checkCRC16( frame ) :
+	"""Return True if frame ends with its valid CRC, lowest byte first.
+
+	The CRC of a message followed by its own CRC is always 0."""
+	return len( frame ) > 2 and modbusCRC16( frame ) == 0
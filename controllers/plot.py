@@ -4,9 +4,14 @@
 # GPL v.3 see master file
 
 import time
+import numpy
 from PyQt4 import Qt
 import PyQt4.Qwt5 as Qwt
 
+from samples import SampleBuffer
+from rollups import Rollups, PRESSURE_RANGE
+from profiler import PROFILER
+
 DEBUG = False
 
 class TimeScaleDraw(Qwt.QwtScaleDraw):
@@ -15,12 +20,33 @@ class TimeScaleDraw(Qwt.QwtScaleDraw):
         Qwt.QwtScaleDraw.__init__(self, *args)
 
     def label(self, v):
-        return Qwt.QwtText( time.strftime('%H:%M %d/%m',time.localtime(v)) )
+        with PROFILER.stage( 'tickLabel' ) :
+            return Qwt.QwtText( time.strftime('%H:%M %d/%m',time.localtime(v)) )
+
+
+class NearestPicker( Qwt.QwtPlotPicker ) :
+    """Picker whose tracker shows the sample nearest to the cursor time."""
+
+    def trackerText( self, pos ) :
+
+        if isinstance( pos, Qt.QPoint ) :
+            pos = self.invTransform( pos )
+
+        sample = self.plot().samples.nearest( pos.x() )
+        if sample is None :
+            return Qwt.QwtText( '' )
+
+        t, value = sample
+        return Qwt.QwtText( '%s  %.4g' % ( time.strftime( '%H:%M:%S %d/%m', time.localtime( t ) ), value ) )
 
 
 class Plot( Qwt.QwtPlot ) :
     """Define a refined QwtPlot class with a nicer design, aligned label,... """
 
+    # (low, high) range of the valid readings, the others are not aggregated
+    # in the rollups, see rollups.Tier
+    validRange = None
+
     def __init__( self, *args ) :
         """ Plot constructor, change axis, init curve """
         Qwt.QwtPlot.__init__( self, *args )
@@ -31,9 +57,18 @@ class Plot( Qwt.QwtPlot ) :
         self.alignScales()
         self.initZoom()
 
-        self.timer = None
+        self.historyLength = 0
+
+        # Name of the channel, used by the exports
+        self.channel = ''
 
-        self.picker = Qwt.QwtPlotPicker(
+        # devices.SerialDevice read by the acquisition, set by the controllers
+        self.device = None
+
+        # RedrawScheduler coalescing the replots, replot at once if None
+        self.scheduler = None
+
+        self.picker = NearestPicker(
             Qwt.QwtPlot.xBottom,
             Qwt.QwtPlot.yLeft,
             Qwt.QwtPicker.PointSelection | Qwt.QwtPicker.DragSelection,
@@ -64,6 +99,7 @@ class Plot( Qwt.QwtPlot ) :
         m.addAction( self.printAct )
         m.addAction( self.exportPdfAct )
         m.addAction( self.exportSvgAct )
+        m.addAction( self.exportRangeAct )
 
         m.exec_( self.mapToGlobal(point) )
 
@@ -97,6 +133,11 @@ class Plot( Qwt.QwtPlot ) :
         Qt.QObject.connect( self.exportSvgAct, Qt.SIGNAL( "triggered()" ),
             self.exportSVG )
 
+        self.exportRangeAct = Qt.QAction( Qt.QIcon('img/saveas.svg'),
+            self._tr('Export visible range...'), self )
+        Qt.QObject.connect( self.exportRangeAct, Qt.SIGNAL( "triggered()" ),
+            self.exportRange )
+
 
     def initGrid( self ) :
         """Create a grid on the plot """
@@ -122,6 +163,17 @@ class Plot( Qwt.QwtPlot ) :
         self.zoomer.setMousePattern( [Qwt.QwtEventPattern.MousePattern( Qt.Qt.MidButton, Qt.Qt.NoModifier),] )
         self.zoomer.initMousePattern(0)
 
+        # Decimate again the curve for the new visible range
+        Qt.QObject.connect( self.zoomer, Qt.SIGNAL( "zoomed(const QwtDoubleRect &)" ),
+            self.zoomChanged )
+
+
+    def zoomChanged( self, rect ) :
+        """Update the decimated curve after a zoom """
+
+        self.updateCurve()
+        self.replot()
+
 
     def clearZoomStack( self ) :
         """Reset the zoom and autoscale plot"""
@@ -130,6 +182,7 @@ class Plot( Qwt.QwtPlot ) :
         self.setAxisAutoScale(Qwt.QwtPlot.yLeft)
         self.zoomer.setZoomBase()
 
+        self.updateCurve()
         self.replot()
 
     def toggleLogScale( self ) :
@@ -147,8 +200,9 @@ class Plot( Qwt.QwtPlot ) :
         """(Re)initialize the curve on the plot """
 
         # (re)Initialize data
-        self.x = []
-        self.y = []
+        self.samples = SampleBuffer( self.historyLength )
+        # Aggregates by minute, 10 minutes and hour, for the long ranges
+        self.rollups = Rollups( validRange = self.validRange )
 
         if self.curve is not None :
             self.curve.detach()
@@ -157,28 +211,136 @@ class Plot( Qwt.QwtPlot ) :
         self.curve = Qwt.QwtPlotCurve()
         self.curve.attach( self )
 
-        self.curve.setSymbol( Qwt.QwtSymbol(
+        # Only shown on sparse curves, see updateCurve
+        self.symbol = Qwt.QwtSymbol(
                         Qwt.QwtSymbol.Ellipse,
                         Qt.QBrush(),
                         Qt.QPen( Qt.Qt.green ),
-                        Qt.QSize(7, 7) ) )
+                        Qt.QSize(7, 7) )
+        self.curve.setSymbol( self.symbol )
 
         self.curve.setPen( Qt.QPen( Qt.Qt.red ) )
 
 
-    def initTimer( self, interval ) :
-        """Start a timer and save a pointer on it """
+    @property
+    def x( self ) :
+        """Times of the stored samples """
+        return self.samples.x
 
-        self.timer = self.startTimer( interval )
-        self.timerEvent() # Read a first value at time t = 0
-        self.zoomer.setZoomBase()
+
+    @property
+    def y( self ) :
+        """Values of the stored samples """
+        return self.samples.y
+
+
+    def addSample( self, t, value ) :
+        """Store a new sample and update the curve with the stored history """
+
+        self.samples.append( t, value )
+        self.rollups.append( t, value )
+        self.trimRollups()
+        self.requestReplot()
+
+
+    def addSamples( self, x, y ) :
+        """Store the samples of the arrays x and y, i.e. from a file """
+
+        self.samples.extend( x, y )
+        self.rollups.extend( x, y )
+        self.trimRollups()
+        self.requestReplot()
+
+
+    def requestReplot( self ) :
+        """Mark the plot as needing a repaint """
+
+        if self.scheduler is not None :
+            self.scheduler.markDirty( self )
+        else :
+            self.refresh()
+
+
+    def refresh( self ) :
+        """Update the curve and repaint the plot """
+
+        self.updateCurve()
+
+        with PROFILER.stage( 'replot' ) :
+            if self.zoomer.zoomRectIndex() == 0 :
+                # Follow the new data while not zoomed, this also replots
+                self.zoomer.setZoomBase()
+            else :
+                self.replot()
 
 
-    def stopTimer( self ) :
-        """Stop the timer if it's running"""
+    def updateCurve( self ) :
+        """Give the curve the samples of the visible range, decimated to one
+            min/max pair per pixel column when there are more samples than pixels.
+            Long ranges are read from the coarsest rollup tier with enough detail.
+        """
 
-        if self.timer:
-            self.killTimer( self.timer )
+        x = self.samples.x
+        y = self.samples.y
+
+        if len( x ) == 0 :
+            self.curve.setData( x, y )
+            return
+
+        xmin, xmax = self.visibleRange()
+
+        columns = max( self.canvas().width(), 1 )
+        with PROFILER.stage( 'decimate' ) :
+            dx, dy = self.rollups.decimate( x, y, xmin, xmax, columns )
+
+        # Symbols of dense curves only overlap, and cost much to paint
+        if len( dx ) > columns / 4 :
+            self.curve.setSymbol( Qwt.QwtSymbol() )
+        else :
+            self.curve.setSymbol( self.symbol )
+
+        with PROFILER.stage( 'setData' ) :
+            self.curve.setData( dx, dy )
+
+
+    def visibleRange( self ) :
+        """Return the times (xmin, xmax) of the visible part of the curve """
+
+        if self.zoomer.zoomRectIndex() == 0 :
+            # Not zoomed, the whole history is visible
+            x = self.samples.x
+            return ( x[0], x[-1] ) if len( x ) else ( 0, 0 )
+
+        rect = self.zoomer.zoomRect()
+        return rect.left(), rect.right()
+
+
+    def setHistoryLength( self, length ) :
+        """Set the maximum number of samples kept in memory, 0 for unlimited """
+
+        self.historyLength = length
+        self.samples.setMaxLength( length )
+        self.trimRollups()
+
+
+    def trimRollups( self ) :
+        """Drop the rollup buckets older than the kept samples, the rollups
+            cover the same history as the samples."""
+
+        if self.historyLength and len( self.samples ) :
+            self.rollups.discardBefore( self.samples.x[0] )
+
+
+    def connect( self ) :
+        """Connect and open the serial port of the device."""
+
+        return self.device.connect()
+
+
+    def disconnect( self ) :
+        """Safe way to close the serial port of the device."""
+
+        self.device.disconnect()
 
 
     def alignScales( self ) :
@@ -196,12 +358,6 @@ class Plot( Qwt.QwtPlot ) :
                     Qwt.QwtAbstractScaleDraw.Backbone, False)
 
 
-    def setInterval( self, interval ) :
-        """Store the interval of the timer event """
-
-        self.interval = interval
-
-
     def printPlot(self):
         """Print the current plot."""
 
@@ -263,3 +419,23 @@ class Plot( Qwt.QwtPlot ) :
             generator.setFileName(fileName)
             generator.setSize(QSize(800, 600))
             self.plot.print_(generator)
+
+
+    def exportRange( self ) :
+        """Export the samples of the visible range, in the .csv format of the save."""
+
+        fileName = Qt.QFileDialog.getSaveFileName(
+            self,
+            'Export File Name',
+            'range.csv',
+            'CSV files (*.csv)')
+
+        if not fileName.isEmpty():
+            xmin, xmax = self.visibleRange()
+            # The last visible sample is included
+            x, y = self.samples.range( xmin, numpy.nextafter( xmax, numpy.inf ) )
+
+            f = open( str( fileName ), 'w' )
+            f.write( self.channel + ' Time;' + ';'.join( map( repr, x.tolist() ) ) + '\n' )
+            f.write( self.channel + ';' + ';'.join( map( repr, y.tolist() ) ) + '\n' )
+            f.close()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# GPL v.3 see master file
+
+"""Opt-in timing of the stages of the GUI event loop.
+
+    The hot paths are wrapped in PROFILER.event( name ) for a whole event
+    of the Qt loop and PROFILER.stage( name ) for its parts :
+
+        with PROFILER.stage( 'replot' ) :
+            self.replot()
+
+    Nothing is measured until PROFILER.enable() is called, a disabled
+    stage costs one attribute lookup. When enabled, the last durations of
+    each stage are kept for rolling percentiles, an event longer than the
+    stall threshold is reported with the stage which took most of it, and
+    all the stages are kept in a trace which dump() writes in the Chrome
+    trace event format (chrome://tracing or https://ui.perfetto.dev).
+
+    Only the GUI thread is profiled, the serial I/O runs in the
+    acquisition threads, see metrics.py for it.
+"""
+
+import json
+import time
+import threading
+import collections
+
+from clock import monotonic
+
+DEBUG = False
+
+class _NoStage( object ) :
+    """Stage of a disabled profiler, does nothing."""
+
+    def __enter__( self ) :
+        return self
+
+    def __exit__( self, *args ) :
+        return False
+
+_NO_STAGE = _NoStage()
+
+
+class _Stage( object ) :
+
+    def __init__( self, profiler, name, isEvent ) :
+
+        self.profiler = profiler
+        self.name = name
+        self.isEvent = isEvent
+
+
+    def __enter__( self ) :
+
+        self.profiler._enter( self )
+        return self
+
+
+    def __exit__( self, *args ) :
+
+        self.profiler._exit( self )
+        return False
+
+
+class Profiler( object ) :
+    """Rolling timings of the stages, stalls and trace, see the module doc."""
+
+    def __init__( self, window = 1000, stallThreshold = 0.1, traceLength = 100000 ) :
+        """Profiler constructor, window is the number of durations kept by
+            stage for the percentiles, stallThreshold the duration of an
+            event reported as a stall, in seconds, and traceLength the
+            number of stages kept in the trace.
+        """
+
+        self.enabled = False
+        self.window = window
+        self.stallThreshold = stallThreshold
+        self.traceLength = traceLength
+
+        # Called with ( event name, duration, culprit stage, its duration )
+        self.stallCallback = None
+
+        self.reset()
+
+
+    def reset( self ) :
+
+        self.durations = {}
+        self.counts = {}
+        self.stalls = collections.deque( maxlen = 100 )
+        self.trace = collections.deque( maxlen = self.traceLength )
+        self.stack = []
+        # The durations are measured on the monotonic clock, not changed by
+        # an adjustment of the system clock, origin maps them to the wall clock
+        self.origin = time.time()
+        self.monotonicOrigin = monotonic()
+
+
+    def enable( self, stallThreshold = None ) :
+
+        if stallThreshold is not None :
+            self.stallThreshold = stallThreshold
+        self.enabled = True
+
+
+    def disable( self ) :
+
+        self.enabled = False
+
+
+    def event( self, name ) :
+        """Time a whole event of the loop, checked for stalls."""
+
+        if not self.enabled :
+            return _NO_STAGE
+        return _Stage( self, name, True )
+
+
+    def stage( self, name ) :
+        """Time a part of an event."""
+
+        if not self.enabled :
+            return _NO_STAGE
+        return _Stage( self, name, False )
+
+
+    def _enter( self, stage ) :
+
+        stage.children = 0.
+        # Exclusive time of the stages inside an event, to find the culprit of a stall
+        stage.exclusive = {}
+        self.stack.append( stage )
+        stage.start = monotonic()
+
+
+    def _exit( self, stage ) :
+
+        duration = monotonic() - stage.start
+
+        if not self.stack or self.stack[-1] is not stage :
+            # Exited out of order, e.g. an exception in a nested stage
+            if stage in self.stack :
+                self.stack = self.stack[ : self.stack.index( stage ) ]
+            return
+        self.stack.pop()
+
+        if stage.name not in self.durations :
+            self.durations[ stage.name ] = collections.deque( maxlen = self.window )
+            self.counts[ stage.name ] = 0
+        self.durations[ stage.name ].append( duration )
+        self.counts[ stage.name ] += 1
+
+        self.trace.append( ( stage.name, stage.start, duration, len( self.stack ) ) )
+
+        exclusive = stage.exclusive
+        exclusive[ stage.name ] = exclusive.get( stage.name, 0 ) + duration - stage.children
+
+        if self.stack :
+            parent = self.stack[-1]
+            parent.children += duration
+            for name, t in exclusive.items() :
+                parent.exclusive[name] = parent.exclusive.get( name, 0 ) + t
+
+        if stage.isEvent and duration >= self.stallThreshold :
+            culprit, t = max( exclusive.items(), key = lambda i : i[1] )
+            self.stalls.append( ( stage.start, stage.name, duration, culprit, t ) )
+
+            if DEBUG:
+                print "Stall of %.0f ms in %s, %.0f ms in %s" % ( duration * 1e3, stage.name, t * 1e3, culprit )
+            if self.stallCallback is not None :
+                self.stallCallback( stage.name, duration, culprit, t )
+
+
+    def wallTime( self, t ) :
+        """Return the time stamp of the monotonic time t of a stage."""
+
+        return self.origin + t - self.monotonicOrigin
+
+
+    def percentiles( self, name, quantiles = ( 0.5, 0.9, 0.99 ) ) :
+        """Return the durations of the quantiles of a stage over the window."""
+
+        durations = sorted( self.durations.get( name, [] ) )
+        if not durations :
+            return [ None for q in quantiles ]
+
+        return [ durations[ min( int( q * len( durations ) ), len( durations ) - 1 ) ] for q in quantiles ]
+
+
+    def report( self ) :
+        """Return a text table of the percentiles of each stage, in ms."""
+
+        lines = [ '%-12s %8s %8s %8s %8s %8s' % ( 'stage', 'count', 'p50', 'p90', 'p99', 'max' ) ]
+        for name in sorted( self.durations ) :
+            p50, p90, p99 = self.percentiles( name )
+            lines.append( '%-12s %8i %8.2f %8.2f %8.2f %8.2f' % ( name, self.counts[name],
+                p50 * 1e3, p90 * 1e3, p99 * 1e3, max( self.durations[name] ) * 1e3 ) )
+
+        lines.append( '%i stall(s) above %.0f ms' % ( len( self.stalls ), self.stallThreshold * 1e3 ) )
+        for start, name, duration, culprit, t in self.stalls :
+            lines.append( '    %s %s %.0f ms, %.0f ms in %s' % ( time.strftime( '%H:%M:%S', time.localtime( self.wallTime( start ) ) ),
+                name, duration * 1e3, t * 1e3, culprit ) )
+
+        return '\n'.join( lines )
+
+
+    def dump( self, filename ) :
+        """Write the trace in the Chrome trace event format."""
+
+        pid = 1
+        tid = threading.current_thread().ident or 0
+        events = [ { 'name' : name, 'ph' : 'X', 'pid' : pid, 'tid' : tid,
+                'ts' : ( start - self.monotonicOrigin ) * 1e6, 'dur' : duration * 1e6 }
+            for name, start, duration, depth in self.trace ]
+        events.extend( [ { 'name' : 'stall in %s' % culprit, 'ph' : 'i', 's' : 't', 'pid' : pid, 'tid' : tid,
+                'ts' : ( start - self.monotonicOrigin ) * 1e6 }
+            for start, name, duration, culprit, t in self.stalls ] )
+
+        f = open( filename, 'w' )
+        json.dump( { 'traceEvents' : events, 'displayTimeUnit' : 'ms' }, f )
+        f.close()
+
+
+# The profiler of the program, disabled by default
+PROFILER = Profiler()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# GPL v.3 see master file
+
+import time
+from PyQt4 import Qt
+
+from profiler import PROFILER
+
+DEBUG = False
+
+class RedrawScheduler( Qt.QObject ) :
+    """Coalesce the replot requests of all the plots of a window.
+
+        The plots are only marked as dirty when they get new data and are
+        repainted together, at most maxFps times per second. Nothing is
+        painted while the window is hidden or minimized, the dirty plots are
+        repainted once it is shown again.
+
+        The time spent in each batch of repaints is kept in lastCost and
+        averageCost (in seconds) and sent with the signal redrawn(double).
+    """
+
+    def __init__( self, window, maxFps = 2 ) :
+        """RedrawScheduler constructor, window is the QWidget showing the plots"""
+
+        Qt.QObject.__init__( self, window )
+
+        self.window = window
+        self.dirty = set()
+        self.timer = None
+        self.lastFrame = 0
+        self.lastCost = 0
+        self.averageCost = 0
+        self.setMaxFps( maxFps )
+
+
+    def setMaxFps( self, maxFps ) :
+        """Change the maximum number of repaints per second """
+
+        self.period = 1. / max( maxFps, 0.01 )
+
+
+    def markDirty( self, plot ) :
+        """Ask for a repaint of plot on the next frame """
+
+        self.dirty.add( plot )
+        self.wake()
+
+
+    def wake( self ) :
+        """Start the frame timer if there is something to paint """
+
+        if self.timer or not self.dirty or not self.isShown() :
+            return
+
+        delay = self.lastFrame + self.period - time.time()
+        self.timer = self.startTimer( max( int( delay * 1000 ), 0 ) )
+
+
+    def isShown( self ) :
+        """Return True if the window can be seen by the user """
+
+        return self.window.isVisible() and not self.window.isMinimized()
+
+
+    def timerEvent( self, e ) :
+        """Repaint all the dirty plots in one batch """
+
+        self.killTimer( self.timer )
+        self.timer = None
+
+        if not self.isShown() :
+            # Keep the plots dirty, wake() is called again when shown
+            return
+
+        start = time.time()
+
+        plots = self.dirty
+        self.dirty = set()
+        with PROFILER.event( 'redraw' ) :
+            for p in plots :
+                p.refresh()
+
+        self.lastFrame = time.time()
+        self.lastCost = self.lastFrame - start
+        self.averageCost = 0.9 * self.averageCost + 0.1 * self.lastCost
+
+        if DEBUG:
+            print "redraw of %i plots in %.1f ms" % ( len( plots ), self.lastCost * 1000 )
+
+        self.emit( Qt.SIGNAL( "redrawn(double)" ), self.lastCost )
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# GPL v.3 see master file
+
+"""Aggregates of the samples at several resolutions, kept as they arrive.
+
+    Each tier splits the time in buckets of resolution seconds, aligned on
+    the epoch, and keeps the min, max, sum and count of the samples of each
+    bucket. A plot of a long history reads the coarsest tier with at least
+    one bucket per pixel column instead of every raw sample.
+"""
+
+import numpy
+
+from samples import minMaxDecimate
+
+DEBUG = False
+
+# Resolutions of the tiers, in seconds
+ROLLUP_RESOLUTIONS = ( 60, 600, 3600 )
+
+# Columns of the tiers
+TIME, MIN, MAX, SUM, COUNT = range( 5 )
+
+# Range of the pressure gauges, the readings outside are errors and would
+# hide the real extrema of their buckets
+PRESSURE_RANGE = ( 1e-15, 1e-1 )
+
+def validRange( channel ) :
+    """Return the (low, high) range of the valid readings of a channel, as
+        for the plots of generatePlots, None if all the readings are valid."""
+
+    return PRESSURE_RANGE if channel.startswith( 'Pressure' ) else None
+
+
+class Tier( object ) :
+    """Min, max, sum and count of the samples in buckets of resolution seconds.
+
+        The samples have to come in increasing time. The last bucket is
+        still growing, the previous ones are complete. With a validRange
+        (low, high), the samples outside ]low, high[ are skipped.
+    """
+
+    def __init__( self, resolution, capacity = 256, validRange = None ) :
+
+        self.resolution = float( resolution )
+        self.validRange = validRange
+        self._data = numpy.empty( ( capacity, 5 ), dtype = numpy.float64 )
+        self._length = 0
+
+
+    def __len__( self ) :
+        return self._length
+
+
+    @property
+    def data( self ) :
+        """View on the (time, min, max, sum, count) rows, no copy."""
+        return self._data[ : self._length ]
+
+
+    @property
+    def time( self ) :
+        """Start times of the buckets."""
+        return self.data[ :, TIME ]
+
+
+    @property
+    def mean( self ) :
+        return self.data[ :, SUM ] / self.data[ :, COUNT ]
+
+
+    def clear( self ) :
+
+        self._length = 0
+
+
+    def append( self, t, value ) :
+        """Add one sample to its bucket."""
+
+        if self.validRange is not None and not self.validRange[0] < value < self.validRange[1] :
+            return
+
+        bucket = t - t % self.resolution
+        n = self._length
+
+        if n and self._data[ n - 1, TIME ] >= bucket :
+            row = self._data[ n - 1 ]
+            row[MIN] = min( row[MIN], value )
+            row[MAX] = max( row[MAX], value )
+            row[SUM] += value
+            row[COUNT] += 1
+            return
+
+        if n == len( self._data ) :
+            self._grow( 1 )
+        self._data[n] = ( bucket, value, value, value, 1 )
+        self._length += 1
+
+
+    def extend( self, x, y ) :
+        """Add the samples of the arrays x and y, x being sorted."""
+
+        if len( x ) == 0 :
+            return
+
+        x = numpy.asarray( x, dtype = numpy.float64 )
+        y = numpy.asarray( y, dtype = numpy.float64 )
+
+        if self.validRange is not None :
+            valid = ( self.validRange[0] < y ) & ( y < self.validRange[1] )
+            if not valid.all() :
+                x = x[valid]
+                y = y[valid]
+                if len( x ) == 0 :
+                    return
+
+        buckets = x - x % self.resolution
+
+        # Samples of the growing bucket, or before it if not sorted
+        n = self._length
+        if n :
+            last = self._data[ n - 1 ]
+            k = numpy.searchsorted( buckets, last[TIME], 'right' )
+            if k :
+                last[MIN] = min( last[MIN], y[ : k ].min() )
+                last[MAX] = max( last[MAX], y[ : k ].max() )
+                last[SUM] += y[ : k ].sum()
+                last[COUNT] += k
+                buckets = buckets[ k : ]
+                y = y[ k : ]
+                if len( y ) == 0 :
+                    return
+
+        starts = numpy.flatnonzero( numpy.diff( buckets ) ) + 1
+        starts = numpy.insert( starts, 0, 0 )
+        m = len( starts )
+
+        if n + m > len( self._data ) :
+            self._grow( m )
+
+        rows = self._data[ n : n + m ]
+        rows[ :, TIME ] = buckets[ starts ]
+        rows[ :, MIN ] = numpy.minimum.reduceat( y, starts )
+        rows[ :, MAX ] = numpy.maximum.reduceat( y, starts )
+        rows[ :, SUM ] = numpy.add.reduceat( y, starts )
+        rows[ :, COUNT ] = numpy.diff( numpy.append( starts, len( y ) ) )
+        self._length += m
+
+
+    def popComplete( self ) :
+        """Remove and return the complete buckets, i.e. all but the last one."""
+
+        if self._length < 2 :
+            return self._data[ : 0 ].copy()
+
+        complete = self._data[ : self._length - 1 ].copy()
+        self._data[0] = self._data[ self._length - 1 ]
+        self._length = 1
+        return complete
+
+
+    def discardBefore( self, t ) :
+        """Remove the buckets which end before the time t."""
+
+        k = numpy.searchsorted( self.time, t - self.resolution, 'right' )
+        if k :
+            self._length -= k
+            self._data[ : self._length ] = self._data[ k : k + self._length ]
+
+
+    def minMax( self ) :
+        """Return the times and values of one min/max pair per bucket, at
+            the middle of the bucket, as a curve keeping the extrema."""
+
+        data = self.data
+        x = numpy.repeat( data[ :, TIME ] + self.resolution / 2, 2 )
+        y = numpy.empty( 2 * len( data ), dtype = numpy.float64 )
+        y[ 0::2 ] = data[ :, MIN ]
+        y[ 1::2 ] = data[ :, MAX ]
+        return x, y
+
+
+    def _grow( self, n ) :
+
+        capacity = max( 2 * len( self._data ), self._length + n )
+        if DEBUG:
+            print "growing %i s tier to %i" % ( self.resolution, capacity )
+
+        data = numpy.empty( ( capacity, 5 ), dtype = numpy.float64 )
+        data[ : self._length ] = self._data[ : self._length ]
+        self._data = data
+
+
+def selectResolution( resolutions, xmin, xmax, columns ) :
+    """Return the coarsest of the resolutions with at least one bucket per
+        column in [xmin, xmax], None if the raw samples are needed."""
+
+    best = None
+    for r in resolutions :
+        if ( xmax - xmin ) / r >= columns and ( best is None or r > best ) :
+            best = r
+    return best
+
+
+class Rollups( object ) :
+    """The tiers of a channel, fed with the same samples as its SampleBuffer.
+
+        validRange is given to the tiers, see Tier and validRange.
+    """
+
+    def __init__( self, resolutions = ROLLUP_RESOLUTIONS, validRange = None ) :
+
+        self.tiers = [ Tier( r, validRange = validRange ) for r in resolutions ]
+
+
+    def append( self, t, value ) :
+
+        for tier in self.tiers :
+            tier.append( t, value )
+
+
+    def extend( self, x, y ) :
+
+        for tier in self.tiers :
+            tier.extend( x, y )
+
+
+    def clear( self ) :
+
+        for tier in self.tiers :
+            tier.clear()
+
+
+    def discardBefore( self, t ) :
+
+        for tier in self.tiers :
+            tier.discardBefore( t )
+
+
+    def select( self, xmin, xmax, columns ) :
+        """Return the coarsest tier with enough detail for the range and
+            width, None if the raw samples are needed."""
+
+        r = selectResolution( [ tier.resolution for tier in self.tiers if len( tier ) ],
+            xmin, xmax, columns )
+        for tier in self.tiers :
+            if tier.resolution == r :
+                return tier
+        return None
+
+
+    def decimate( self, x, y, xmin, xmax, columns ) :
+        """Like samples.minMaxDecimate on the raw samples x and y, but
+            read from the coarsest tier which has enough detail."""
+
+        tier = self.select( xmin, xmax, columns )
+        if tier is None :
+            return minMaxDecimate( x, y, xmin, xmax, columns )
+
+        tx, ty = tier.minMax()
+        return minMaxDecimate( tx, ty, xmin, xmax, columns )
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# GPL v.3 see master file
+
+import numpy
+
+DEBUG = False
+
+class SampleBuffer( object ) :
+    """Store the (time, value) samples of a plot in typed numpy arrays.
+
+        The arrays are preallocated and grow by doubling. If a maximum
+        length is given, the buffer behaves like a ring : the oldest samples
+        are dropped and the storage is compacted from time to time, so that
+        x and y are always contiguous views which can be handed to the curve
+        without building a new list.
+    """
+
+    def __init__( self, maxLength = 0, capacity = 1024 ) :
+        """SampleBuffer constructor, maxLength = 0 means unlimited history."""
+
+        self.maxLength = maxLength
+        if maxLength :
+            capacity = min( capacity, 2 * maxLength )
+
+        self._x = numpy.empty( capacity, dtype = numpy.float64 )
+        self._y = numpy.empty( capacity, dtype = numpy.float64 )
+        self._start = 0
+        self._end = 0
+
+
+    def __len__( self ) :
+        return self._end - self._start
+
+
+    @property
+    def x( self ) :
+        """View on the stored times, no copy."""
+        return self._x[ self._start : self._end ]
+
+
+    @property
+    def y( self ) :
+        """View on the stored values, no copy."""
+        return self._y[ self._start : self._end ]
+
+
+    def append( self, t, value ) :
+        """Add a sample at the end of the buffer, drop the oldest one if full."""
+
+        if self.maxLength and len( self ) >= self.maxLength :
+            self._start += len( self ) - self.maxLength + 1
+
+        if self._end == len( self._x ) :
+            self._makeRoom( 1 )
+
+        self._x[ self._end ] = t
+        self._y[ self._end ] = value
+        self._end += 1
+
+
+    def extend( self, x, y ) :
+        """Add the samples of the arrays x and y at the end of the buffer."""
+
+        n = len( x )
+
+        if self.maxLength :
+            if n >= self.maxLength :
+                x = x[ -self.maxLength : ]
+                y = y[ -self.maxLength : ]
+                n = self.maxLength
+                self.clear()
+
+            drop = len( self ) + n - self.maxLength
+            if drop > 0 :
+                self._start += drop
+
+        if self._end + n > len( self._x ) :
+            self._makeRoom( n )
+
+        self._x[ self._end : self._end + n ] = x
+        self._y[ self._end : self._end + n ] = y
+        self._end += n
+
+
+    def range( self, start, stop ) :
+        """Return the views on the samples with start <= time < stop, no copy.
+
+            The times are increasing, the range is found by bisection.
+        """
+
+        x = self.x
+        first = numpy.searchsorted( x, start, 'left' )
+        last = numpy.searchsorted( x, stop, 'left' )
+        return x[ first : last ], self.y[ first : last ]
+
+
+    def nearest( self, t ) :
+        """Return the (time, value) sample nearest to the time t, None if empty."""
+
+        x = self.x
+        if len( x ) == 0 :
+            return None
+
+        i = numpy.searchsorted( x, t )
+        if i == len( x ) or ( i > 0 and t - x[ i - 1 ] < x[i] - t ) :
+            i -= 1
+        return x[i], self.y[i]
+
+
+    def clear( self ) :
+        """Forget all the samples but keep the allocated memory."""
+
+        self._start = 0
+        self._end = 0
+
+
+    def setMaxLength( self, maxLength ) :
+        """Change the maximum number of samples kept, 0 for unlimited."""
+
+        self.maxLength = maxLength
+        if maxLength and len( self ) > maxLength :
+            self._start = self._end - maxLength
+
+
+    def _makeRoom( self, n ) :
+        """Compact the data at the beginning of the arrays, or grow them,
+            to have room for n more samples."""
+
+        length = len( self )
+        capacity = len( self._x )
+
+        if self._start > 0 and 2 * ( length + n - 1 ) <= capacity :
+            # Enough space was freed by the dropped samples, just move
+            self._x[ : length ] = self._x[ self._start : self._end ]
+            self._y[ : length ] = self._y[ self._start : self._end ]
+
+        else :
+            capacity = max( 2 * capacity, length + n )
+            if self.maxLength :
+                capacity = max( min( capacity, 2 * self.maxLength ), length + n )
+
+            if DEBUG:
+                print "growing sample buffer to %i" % capacity
+
+            x = numpy.empty( capacity, dtype = numpy.float64 )
+            y = numpy.empty( capacity, dtype = numpy.float64 )
+            x[ : length ] = self._x[ self._start : self._end ]
+            y[ : length ] = self._y[ self._start : self._end ]
+            self._x = x
+            self._y = y
+
+        self._start = 0
+        self._end = length
+
+
+def minMaxDecimate( x, y, xmin, xmax, columns ) :
+    """Reduce the samples in [xmin, xmax] to one min/max pair per column.
+
+        x has to be sorted. The samples just outside the range are kept so
+        that the curve still goes to the border of the plot. If there are
+        not more samples than 2 * columns, the views are returned unchanged.
+        As the extrema of every column are kept, a spike of a single
+        sample is never lost.
+    """
+
+    first = max( numpy.searchsorted( x, xmin, 'left' ) - 1, 0 )
+    last = min( numpy.searchsorted( x, xmax, 'right' ) + 1, len( x ) )
+    x = x[ first : last ]
+    y = y[ first : last ]
+
+    if len( x ) <= 2 * columns or xmax <= xmin :
+        return x, y
+
+    edges = numpy.linspace( xmin, xmax, columns + 1 )
+    starts = numpy.unique( numpy.searchsorted( x, edges[ : -1 ], 'left' ) )
+    starts = starts[ starts < len( x ) ]
+    ends = numpy.append( starts[ 1 : ], len( x ) ) - 1
+
+    # Samples before xmin are in the first column, after xmax in the last one
+    if starts[0] != 0 :
+        starts = numpy.insert( starts, 0, 0 )
+        ends = numpy.insert( ends, 0, starts[1] - 1 )
+
+    dx = numpy.empty( 2 * len( starts ), dtype = numpy.float64 )
+    dy = numpy.empty( 2 * len( starts ), dtype = numpy.float64 )
+    dx[ 0::2 ] = x[ starts ]
+    dx[ 1::2 ] = x[ ends ]
+    dy[ 0::2 ] = numpy.fmin.reduceat( y, starts )
+    dy[ 1::2 ] = numpy.fmax.reduceat( y, starts )
+
+    return dx, dy
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# GPL v.3 see master file
+
+"""Software controllers, to test and benchmark without the instruments.
+
+    A simulator answers on a pseudo terminal with the same wire protocol as
+    a real controller, so the drivers of devices.py are used unchanged by
+    opening the simulator port. Each reply can be delayed (latency and
+    jitter in seconds), dropped or corrupted with a given probability.
+
+    Only for Linux and other systems with pseudo terminals.
+"""
+
+import os
+import tty
+import time
+import math
+import random
+import select
+import threading
+from struct import pack
+
+import config
+from modbusCRC16 import modbusCRC16, checkCRC16
+
+DEBUG = False
+
+class Simulator( threading.Thread ) :
+    """Base class of the simulators, serve the master side of a pseudo terminal.
+
+        The drivers open the slave side, which name is in port. A simulator
+        defines process(), which consumes the complete queries of buffer
+        and returns the list of replies.
+    """
+
+    def __init__( self, latency = 0.005, jitter = 0, dropRate = 0, corruptRate = 0, seed = None ) :
+
+        threading.Thread.__init__( self )
+        self.setDaemon( True )
+
+        self.latency = latency
+        self.jitter = jitter
+        self.dropRate = dropRate
+        self.corruptRate = corruptRate
+        self.random = random.Random( seed )
+
+        self.master, self.slave = os.openpty()
+        tty.setraw( self.slave )
+        self.port = os.ttyname( self.slave )
+
+        self.stopEvent = threading.Event()
+        self.buffer = ''
+        self.queries = 0
+        self.startTime = time.time()
+
+
+    def addDevice( self, channel ) :
+        """Add a device of a setup channel configuration, see config.SETUPS."""
+
+        pass
+
+
+    def stop( self ) :
+
+        self.stopEvent.set()
+
+
+    def run( self ) :
+
+        while not self.stopEvent.isSet() :
+            ready = select.select( [ self.master ], [], [], 0.1 )[0]
+            if not ready :
+                continue
+
+            try :
+                self.buffer += os.read( self.master, 1024 )
+            except OSError :
+                # The slave side was closed
+                break
+
+            for reply in self.process() :
+                self.send( reply )
+
+        os.close( self.master )
+        os.close( self.slave )
+
+
+    def send( self, reply ) :
+        """Send a reply after the latency, or drop or corrupt it."""
+
+        self.queries += 1
+
+        delay = self.latency + self.random.uniform( 0, self.jitter )
+        if delay > 0 :
+            time.sleep( delay )
+
+        if self.random.random() < self.dropRate :
+            if DEBUG:
+                print "%s dropped %r" % ( self.port, reply )
+            return
+
+        if reply and self.random.random() < self.corruptRate :
+            i = self.random.randrange( len( reply ) )
+            reply = reply[ : i ] + chr( ord( reply[i] ) ^ ( 1 << self.random.randrange( 8 ) ) ) + reply[ i + 1 : ]
+
+        os.write( self.master, reply )
+
+
+    def splitLines( self, terminator ) :
+        """Consume and return the complete lines of buffer."""
+
+        lines = self.buffer.split( terminator )
+        self.buffer = lines.pop()
+        return lines
+
+
+    def wave( self, base, amplitude, period ) :
+        """A slowly changing value, with some noise."""
+
+        t = time.time() - self.startTime
+        return base + amplitude * math.sin( 2 * math.pi * t / period ) + self.random.gauss( 0, amplitude / 50. )
+
+
+class IGC3( Simulator ) :
+    """IGC3 pressure controllers daisy chained on one RS-485 bus, Modbus function 0x17."""
+
+    # Address, function 0x17, 10 bytes of parameters, CRC
+    QUERY_SIZE = 13
+
+    def __init__( self, *args, **kwargs ) :
+
+        Simulator.__init__( self, *args, **kwargs )
+        self.pressures = {}
+
+
+    def addDevice( self, channel ) :
+
+        self.pressures[ channel['deviceAddress'] ] = 10 ** self.random.uniform( -11, -8 )
+
+
+    def process( self ) :
+
+        replies = []
+
+        while len( self.buffer ) >= self.QUERY_SIZE :
+            frame = self.buffer[ : self.QUERY_SIZE ]
+
+            if not checkCRC16( frame ) :
+                # Out of sync, try from the next byte
+                self.buffer = self.buffer[ 1 : ]
+                continue
+
+            self.buffer = self.buffer[ self.QUERY_SIZE : ]
+            address = frame[0]
+
+            # Only the addressed controller answers on the bus
+            if address in self.pressures and frame[1] == '\x17' :
+                replies.append( self.reply( address ) )
+
+        return replies
+
+
+    def reply( self, address ) :
+
+        # Log random walk, with rare pressure bursts
+        p = self.pressures[address] * math.exp( self.random.gauss( 0, 0.02 ) )
+        self.pressures[address] = min( max( p, 1e-12 ), 1e-6 )
+        if self.random.random() < 0.01 :
+            p *= 100
+
+        msg = address + '\x17\x04' + pack( 'f', p )
+        crc = modbusCRC16( msg )
+        return msg + chr( crc % 0x0100 ) + chr( crc >> 8 )
+
+
+class Lakeshore331( Simulator ) :
+    """LakeShore 331 temperature controller, answers CRDG? queries."""
+
+    def process( self ) :
+
+        replies = []
+        for line in self.splitLines( '\n' ) :
+            if line.startswith( 'CRDG?' ) :
+                replies.append( '%+08.3f\r\n' % self.wave( 150, 100, 3600 ) )
+        return replies
+
+
+class MVC3( Simulator ) :
+    """MVC-3 pressure controller, answers RPV<n> queries.
+
+        The replies end with <CR><LF> as the driver reads them by line.
+    """
+
+    def process( self ) :
+
+        replies = []
+        for line in self.splitLines( '\r' ) :
+            command = line.split( ',' )[-1].strip()
+            if command.startswith( 'RPV' ) :
+                p = 10 ** self.wave( -9, 1, 1800 )
+                replies.append( '0,\t%.4E\r\n' % p )
+        return replies
+
+
+class TwickenhamHeDepth( Simulator ) :
+    """Twickenham He Depth Indicator, T triggers a reading and G returns it."""
+
+    def __init__( self, *args, **kwargs ) :
+
+        Simulator.__init__( self, *args, **kwargs )
+        self.level = 500.
+
+
+    def process( self ) :
+
+        replies = []
+        for line in self.splitLines( '\n' ) :
+            command = line.strip()
+            if command == 'T' :
+                self.level = max( self.level - self.random.uniform( 0, 0.5 ), 0 )
+            elif command == 'G' :
+                replies.append( 'A %03.0f mm\r\n' % self.level )
+        return replies
+
+
+def simulate( setup, **options ) :
+    """Start a simulator for each serial bus of a setup.
+
+        A copy of the setup using the simulator ports is added to
+        config.SETUPS, its name is returned with the list of the running
+        simulators. options are given to the simulators constructors.
+    """
+
+    channels = []
+    simulators = {}
+
+    for c in config.SETUPS[setup] :
+        c = dict( c )
+        bus = c.get( 'bus', c['channel'] )
+
+        if bus not in simulators :
+            simulators[bus] = globals()[ c['type'] ]( **options )
+            c['serialPort'] = simulators[bus].port
+
+        simulators[bus].addDevice( c )
+        channels.append( c )
+
+    for s in simulators.values() :
+        s.start()
+
+    name = 'Simulated ' + setup
+    config.SETUPS[name] = channels
+
+    return name, simulators.values()
+
+
+def addGaugesSetup( count, perBus = 8 ) :
+    """Add a setup of count IGC3 gauges, daisy chained by perBus, to config.SETUPS.
+
+        Return the name of the setup, which can be given to simulate.
+    """
+
+    channels = []
+    for i in xrange( count ) :
+        c = { 'channel' : 'Gauge %i' % ( i + 1 ), 'type' : 'IGC3',
+            'deviceAddress' : chr( i % perBus + 1 ), 'deviceName' : str( i + 1 ) }
+        if i % perBus :
+            c['bus'] = channels[ i - i % perBus ]['channel']
+        channels.append( c )
+
+    name = '%i gauges' % count
+    config.SETUPS[name] = channels
+
+    return name
@@ -0,0 +1,526 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# GPL v.3 see master file
+
+"""Files where the samples are stored.
+
+    The row format is a ';' separated text file, with one sample per row,
+    which can be appended to without rewriting the previous samples :
+
+        Timestamp;Channel;Value
+        1376487012.51;Temperature;23.5
+        1376487012.53;Pressure LT;2.1e-10
+
+    The binary log has one file per channel, made of fixed size records,
+    which are memory mapped by the readers : opening a file of several
+    months or taking a time window of it does not read the whole file.
+
+    The rollup files keep the min, max, mean and count of each channel by
+    minute, 10 minutes and hour, see rollups.py, to plot long histories
+    without reading the samples.
+"""
+
+import os
+import re
+import glob
+import struct
+
+DEBUG = False
+
+ROW_HEADER = 'Timestamp;Channel;Value'
+
+# Bytes read at most to recognize the format of a file
+HEADER_PREFIX = 4096
+
+class RowWriter( object ) :
+    """Append the samples to a file in the row format."""
+
+    def __init__( self, filename ) :
+
+        self.filename = filename
+        self.count = 0
+
+        newFile = not os.path.exists( filename ) or os.path.getsize( filename ) == 0
+
+        self.file = open( filename, 'a' )
+        if newFile :
+            self.file.write( ROW_HEADER + '\n' )
+
+
+    def write( self, samples ) :
+        """Append a list of (channel, time, value) samples, and flush them to the disk."""
+
+        self.file.write( ''.join( [ '%s;%s;%s\n' % ( repr( float(t) ), channel, repr( float(value) ) )
+            for channel, t, value in samples ] ) )
+        self.file.flush()
+
+        self.count += len( samples )
+
+
+    def close( self ) :
+
+        self.file.close()
+
+
+# Binary log : one file per channel, a fixed header followed by
+# (time, value) float64 little endian records.
+BINARY_MAGIC = 'LABMON01'
+BINARY_HEADER_SIZE = 64
+BINARY_RECORD = struct.Struct( '<dd' )
+
+def _safeName( channel ) :
+    """Return channel with only the characters allowed in file names, the
+        same for a name in unicode or in UTF-8."""
+
+    if isinstance( channel, unicode ) :
+        channel = channel.encode( 'utf-8' )
+    return re.sub( r'\W', '_', channel )
+
+
+def _header( magic, channel ) :
+    """Return the file header of channel, its name is stored in UTF-8."""
+
+    if isinstance( channel, unicode ) :
+        channel = channel.encode( 'utf-8' )
+    # A byte string is written as it is, encode would decode it as ASCII first
+    header = magic + channel
+    return header[ : BINARY_HEADER_SIZE ].ljust( BINARY_HEADER_SIZE, '\0' )
+
+
+def binaryFilename( basename, channel ) :
+    """Return the file of a channel in the binary log basename."""
+
+    return '%s_%s.bin' % ( basename, _safeName( channel ) )
+
+
+class BinaryWriter( object ) :
+    """Append the samples to the per channel files of a binary log.
+
+        The header contains the name of the channel, the file name only
+        its characters allowed in file names.
+    """
+
+    def __init__( self, basename ) :
+
+        self.basename = basename
+        self.files = {}
+        self.count = 0
+
+
+    def channelFile( self, channel ) :
+        """Return the file of channel, create it with its header if needed."""
+
+        if channel not in self.files :
+            filename = binaryFilename( self.basename, channel )
+            f = open( filename, 'ab' )
+            if f.tell() == 0 :
+                f.write( _header( BINARY_MAGIC, channel ) )
+            self.files[channel] = f
+
+        return self.files[channel]
+
+
+    def write( self, samples ) :
+        """Append a list of (channel, time, value) samples, and flush them to the disk."""
+
+        records = {}
+        for channel, t, value in samples :
+            records.setdefault( channel, [] ).append( BINARY_RECORD.pack( t, value ) )
+
+        for channel, r in records.items() :
+            f = self.channelFile( channel )
+            f.write( ''.join( r ) )
+            f.flush()
+
+        self.count += len( samples )
+
+
+    def close( self ) :
+
+        for f in self.files.values() :
+            f.close()
+        self.files = {}
+
+
+def readBinaryHeader( filename ) :
+    """Return the channel name stored in the header of a binary log file, or None."""
+
+    f = open( filename, 'rb' )
+    header = f.read( BINARY_HEADER_SIZE )
+    f.close()
+
+    if len( header ) < BINARY_HEADER_SIZE or not header.startswith( BINARY_MAGIC ) :
+        return None
+
+    return header[ len( BINARY_MAGIC ) : ].rstrip( '\0' ).decode( 'utf-8' )
+
+
+def mapBinaryFile( filename ) :
+    """Memory map the records of a binary log file, nothing is read.
+
+        Return a read only numpy record array with 'time' and 'value' fields.
+    """
+
+    # numpy is only needed to read the logs, not by the headless acquisition
+    import numpy
+
+    dtype = numpy.dtype( [ ( 'time', '<f8' ), ( 'value', '<f8' ) ] )
+    count = ( os.path.getsize( filename ) - BINARY_HEADER_SIZE ) // dtype.itemsize
+
+    if count <= 0 :
+        return numpy.zeros( 0, dtype = dtype )
+
+    # A record being written at the end of the file is ignored
+    return numpy.memmap( filename, dtype = dtype, mode = 'r',
+        offset = BINARY_HEADER_SIZE, shape = ( count, ) )
+
+
+def openBinaryLog( basename ) :
+    """Memory map all the channel files of the binary log basename.
+
+        Return a dict channel name -> record array, see mapBinaryFile.
+    """
+
+    log = {}
+    for filename in glob.glob( basename + '_*.bin' ) :
+        channel = readBinaryHeader( filename )
+        # The pattern also matches the logs of other runs, i.e. basename_2_*
+        if channel is not None and binaryFilename( basename, channel ) == filename :
+            log[channel] = mapBinaryFile( filename )
+
+    return log
+
+
+def timeWindow( records, start, stop ) :
+    """Return the records with start <= time < stop, as a view without copy.
+
+        The times have to be increasing. The search is a bisection on the
+        memory mapped times, only a few pages of the file are read.
+    """
+
+    # numpy is only needed to read the logs, not by the headless acquisition
+    import numpy
+
+    first, last = numpy.searchsorted( records['time'], ( start, stop ), 'left' )
+    return records[ first : last ]
+
+
+# Rollup files : one file per channel and resolution, a header as for the
+# binary log followed by (time, min, max, mean, count) float64 records
+ROLLUP_MAGIC = 'LABROL01'
+ROLLUP_RECORD = struct.Struct( '<5d' )
+
+def rollupFilename( basename, channel, resolution ) :
+    """Return the file of a channel tier in the rollups of basename."""
+
+    return '%s_%s.%is.rollup' % ( basename, _safeName( channel ), resolution )
+
+
+class RollupWriter( object ) :
+    """Append the complete buckets of the rollups of each channel to files.
+
+        The bucket being filled is kept in memory and only written by
+        close, so the files are only appended to.
+    """
+
+    def __init__( self, basename, resolutions = None ) :
+
+        # numpy is not needed by the headless acquisition without rollups
+        import rollups
+
+        self.basename = basename
+        self.resolutions = resolutions or rollups.ROLLUP_RESOLUTIONS
+        self.rollups = {}
+        self.files = {}
+        self.count = 0
+
+
+    def channelFiles( self, channel ) :
+        """Return the rollups of channel and their files, created if needed."""
+
+        if channel not in self.rollups :
+            import rollups
+
+            self.rollups[channel] = rollups.Rollups( self.resolutions, rollups.validRange( channel ) )
+            files = []
+            for r in self.resolutions :
+                f = open( rollupFilename( self.basename, channel, r ), 'ab' )
+                if f.tell() == 0 :
+                    f.write( _header( ROLLUP_MAGIC, channel ) )
+                files.append( f )
+            self.files[channel] = files
+
+        return self.rollups[channel], self.files[channel]
+
+
+    def write( self, samples ) :
+        """Add a list of (channel, time, value) samples, write the complete buckets."""
+
+        chunks = {}
+        for channel, t, value in samples :
+            times, values = chunks.setdefault( channel, ( [], [] ) )
+            times.append( t )
+            values.append( value )
+
+        for channel, ( times, values ) in chunks.items() :
+            rollups, files = self.channelFiles( channel )
+            rollups.extend( times, values )
+            for tier, f in zip( rollups.tiers, files ) :
+                self.writeRows( f, tier.popComplete() )
+
+        self.count += len( samples )
+
+
+    def writeRows( self, f, rows ) :
+
+        if len( rows ) :
+            import rollups
+
+            rows = rows.copy()
+            # The mean is stored instead of the sum
+            rows[ :, rollups.SUM ] /= rows[ :, rollups.COUNT ]
+            f.write( rows.astype( '<f8' ).tostring() )
+            f.flush()
+
+
+    def close( self ) :
+
+        for channel, files in self.files.items() :
+            for tier, f in zip( self.rollups[channel].tiers, files ) :
+                self.writeRows( f, tier.data )
+                f.close()
+
+        self.rollups = {}
+        self.files = {}
+
+
+def openRollups( basename ) :
+    """Memory map the rollup files of basename.
+
+        Return a dict channel name -> { resolution : array }, where the
+        arrays have (time, min, max, mean, count) rows.
+    """
+
+    import numpy
+
+    log = {}
+    for filename in glob.glob( basename + '_*.rollup' ) :
+        f = open( filename, 'rb' )
+        header = f.read( BINARY_HEADER_SIZE )
+        f.close()
+        if len( header ) < BINARY_HEADER_SIZE or not header.startswith( ROLLUP_MAGIC ) :
+            continue
+
+        channel = header[ len( ROLLUP_MAGIC ) : ].rstrip( '\0' ).decode( 'utf-8' )
+        match = re.search( r'\.(\d+)s\.rollup$', filename )
+        if match is None :
+            continue
+        resolution = int( match.group( 1 ) )
+        # The pattern also matches the rollups of other runs, i.e. basename_2_*
+        if rollupFilename( basename, channel, resolution ) != filename :
+            continue
+        count = ( os.path.getsize( filename ) - BINARY_HEADER_SIZE ) // ROLLUP_RECORD.size
+
+        if count <= 0 :
+            rows = numpy.zeros( ( 0, 5 ) )
+        else :
+            rows = numpy.memmap( filename, dtype = '<f8', mode = 'r',
+                offset = BINARY_HEADER_SIZE, shape = ( count, 5 ) )
+        log.setdefault( channel, {} )[resolution] = rows
+
+    return log
+
+
+def readSamples( filename, blockSize = 1 << 20 ) :
+    """Read a file saved in any of our formats, by chunks of about blockSize bytes.
+
+        This is a generator of (channel, times, values) with numpy arrays,
+        the samples of a channel come in increasing time over the chunks.
+        The formats are recognized from the file :
+
+        - a binary log file, all the channels of the log are read
+        - the row format, see RowWriter
+        - the ';' format of the save, lines 'name Time;...' and 'name;...',
+          or a single 'Time;...' line for all the channels
+        - the old tab separated format, 'Time\\tTemperature\\tPressure' with
+          the time in minutes
+
+        Raise ValueError for unknown formats.
+    """
+
+    channel = readBinaryHeader( filename )
+    if channel is not None :
+        suffix = binaryFilename( '', channel )
+        return _readBinary( filename[ : -len( suffix ) ], blockSize )
+
+    f = open( filename, 'r' )
+    # Only a prefix, the first line of the ';' format is the whole time axis
+    header = f.readline( HEADER_PREFIX )
+
+    if header.startswith( ROW_HEADER ) :
+        return _readRows( f, blockSize )
+
+    elif header.startswith( 'Time\t' ) :
+        if not header.endswith( '\n' ) :
+            header += f.readline()
+        return _readTabs( f, header, blockSize )
+
+    elif ';' in header :
+        f.seek( 0 )
+        return _readTransposed( f, blockSize )
+
+    f.close()
+    raise ValueError( 'Unknown file format' )
+
+
+def _readBinary( basename, blockSize ) :
+
+    records = blockSize // BINARY_RECORD.size
+
+    for channel, log in openBinaryLog( basename ).items() :
+        for i in xrange( 0, len( log ), records ) :
+            chunk = log[ i : i + records ]
+            yield channel, chunk['time'], chunk['value']
+
+
+def _readRows( f, blockSize ) :
+
+    import numpy
+
+    while True :
+        lines = f.readlines( blockSize )
+        if not lines :
+            break
+
+        chunk = {}
+        for line in lines :
+            fields = line.rstrip().split( ';' )
+            if len( fields ) != 3 :
+                # Row being written when the file was read
+                continue
+            try :
+                t, value = float( fields[0] ), float( fields[2] )
+            except ValueError :
+                # Also cut while written, i.e. '1234.5;chan;'
+                continue
+            times, values = chunk.setdefault( fields[1], ( [], [] ) )
+            times.append( t )
+            values.append( value )
+
+        for channel, ( times, values ) in chunk.items() :
+            yield channel, numpy.array( times, dtype = float ), numpy.array( values, dtype = float )
+
+    f.close()
+
+
+def _readTabs( f, header, blockSize ) :
+
+    import numpy
+
+    labels = header.rstrip().split( '\t' )
+    timeIndex = labels.index( 'Time' )
+
+    # The time is in minutes from the start, assume the file was closed at
+    # the last sample to find back the date of the measurement
+    start = f.tell()
+    f.seek( 0, os.SEEK_END )
+    f.seek( max( f.tell() - 4096, start ) )
+    tail = [ l.split() for l in f.read().splitlines() ]
+    tail = [ l for l in tail if len( l ) == len( labels ) ]
+    last = float( tail[-1][timeIndex] ) if tail else 0
+    origin = os.fstat( f.fileno() ).st_mtime - last * 60
+    f.seek( start )
+    # Line of the file before the block, the header is line 1
+    line = 1
+
+    while True :
+        lines = f.readlines( blockSize )
+        if not lines :
+            break
+
+        # The number of values of each row is checked, a short row would
+        # shift all the following values to the wrong channels
+        try :
+            data = numpy.loadtxt( lines, ndmin = 2 )
+        except ValueError as e :
+            raise ValueError( 'Bad row after line %i : %s' % ( line, e ) )
+        if data.size == 0 :
+            data = numpy.zeros( ( 0, len( labels ) ) )
+        elif data.shape[1] != len( labels ) :
+            raise ValueError( 'Rows of %i values after line %i for the %i columns %s' % (
+                data.shape[1], line, len( labels ), ', '.join( labels ) ) )
+        line += len( lines )
+
+        times = data[ :, timeIndex ] * 60 + origin
+
+        for i, label in enumerate( labels ) :
+            if i != timeIndex :
+                yield label, times, data[ :, i ]
+
+    f.close()
+
+
+def _readTransposed( f, blockSize ) :
+
+    import numpy
+
+    rest = ''
+    label = None
+    times = numpy.zeros( 0 )
+
+    while True :
+        block = f.read( blockSize )
+        text = rest + block
+        pos = 0
+
+        while pos < len( text ) :
+
+            if label is None :
+                # Start of a line, the label is the first field
+                sep = text.find( ';', pos )
+                nl = text.find( '\n', pos )
+                if nl != -1 and ( sep == -1 or nl < sep ) :
+                    pos = nl + 1
+                    continue
+                if sep == -1 :
+                    break
+                label = text[ pos : sep ].strip()
+                isTime = label == 'Time' or label.endswith( ' Time' )
+                timeParts = []
+                index = 0
+                pos = sep + 1
+
+            nl = text.find( '\n', pos )
+            end = nl
+            if nl == -1 :
+                end = len( text )
+                if block :
+                    # The last value might be cut, keep it for the next block
+                    end = text.rfind( ';', pos )
+                    if end == -1 :
+                        break
+
+            values = numpy.fromstring( text[ pos : end ].strip(), sep = ';' )
+
+            if isTime :
+                timeParts.append( values )
+            else :
+                # Values without time are dropped
+                n = max( min( len( values ), len( times ) - index ), 0 )
+                if n :
+                    yield label, times[ index : index + n ], values[ : n ]
+                index += len( values )
+
+            pos = end + 1
+            if nl != -1 or not block :
+                # End of the line
+                if isTime :
+                    times = numpy.concatenate( timeParts ) if timeParts else numpy.zeros( 0 )
+                label = None
+
+        rest = text[ pos : ]
+        if not block :
+            break
+
+    f.close()
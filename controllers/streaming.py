@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# GPL v.3 see master file
+
+"""Publish the samples on a local TCP socket as soon as they are read.
+
+    The protocol is line based text. A client sends commands :
+
+        SUB <channel>       subscribe to a channel, * for all of them
+        UNSUB <channel>     unsubscribe, * for all of them
+        CHANNELS            list the channels seen up to now
+
+    and receives the samples of its channels as rows of the autosave
+    format, see storage.RowWriter :
+
+        1376487012.53;Pressure LT;2.1e-10
+
+    The last samples of a channel are sent again after a SUB, so a late
+    client gets a short history. Lines starting with # are information,
+    i.e. the reply to CHANNELS or errors.
+
+    The server runs in its own thread with non blocking sockets : publish
+    only puts the sample in a queue, and a subscriber reading too slowly is
+    disconnected instead of slowing down the others or the acquisition.
+"""
+
+import errno
+import select
+import socket
+import threading
+import collections
+import Queue
+
+DEBUG = False
+
+DEFAULT_PORT = 50200
+
+def _socketPair() :
+    """Return two connected sockets, also on systems without socketpair."""
+
+    try :
+        return socket.socketpair()
+    except ( AttributeError, socket.error ) :
+        # i.e. Windows
+        listener = socket.socket( socket.AF_INET, socket.SOCK_STREAM )
+        listener.bind( ( '127.0.0.1', 0 ) )
+        listener.listen( 1 )
+        a = socket.create_connection( listener.getsockname() )
+        b = listener.accept()[0]
+        listener.close()
+        return a, b
+
+
+class Subscriber( object ) :
+    """A client connection, with its channels and the data not sent yet."""
+
+    def __init__( self, sock, address ) :
+
+        self.sock = sock
+        self.address = address
+        self.channels = set()
+        self.all = False
+        self.input = ''
+        self.output = ''
+
+
+    def wants( self, channel ) :
+
+        return self.all or channel in self.channels
+
+
+class StreamServer( threading.Thread ) :
+    """Serve the published samples to the subscribers, see the module doc."""
+
+    def __init__( self, port = DEFAULT_PORT, host = '127.0.0.1', replay = 100, maxBuffer = 1 << 20 ) :
+        """StreamServer constructor, replay is the number of samples sent
+            again to the new subscribers of a channel and maxBuffer the size
+            in bytes of the data waiting for a subscriber before it is
+            disconnected.
+        """
+
+        threading.Thread.__init__( self )
+        self.setDaemon( True )
+
+        self.replay = replay
+        self.maxBuffer = maxBuffer
+
+        self.listener = socket.socket( socket.AF_INET, socket.SOCK_STREAM )
+        self.listener.setsockopt( socket.SOL_SOCKET, socket.SO_REUSEADDR, 1 )
+        self.listener.bind( ( host, port ) )
+        self.listener.listen( 16 )
+        self.listener.setblocking( 0 )
+        self.address = self.listener.getsockname()
+
+        # Written by publish to wake the select loop
+        self.wakeWriter, self.wakeReader = _socketPair()
+        self.wakeReader.setblocking( 0 )
+        # publish is called by the bus threads, it must never wait on the loop
+        self.wakeWriter.setblocking( 0 )
+
+        self.pending = Queue.Queue()
+        self.history = {}
+        self.subscribers = {}
+        self.stopEvent = threading.Event()
+
+        self.published = 0
+        self.dropped = 0
+
+
+    def publish( self, channel, t, value ) :
+        """Send a sample to the subscribers, never blocks. Thread safe."""
+
+        self.pending.put( ( channel, t, value ) )
+        try :
+            self.wakeWriter.send( '\0' )
+        except socket.error :
+            # The loop is awake anyway if the wake socket is full
+            pass
+
+
+    def stop( self ) :
+
+        self.stopEvent.set()
+        self.publish( None, 0, 0 )
+
+
+    def run( self ) :
+
+        while not self.stopEvent.isSet() :
+
+            readers = [ self.listener, self.wakeReader ] + self.subscribers.keys()
+            writers = [ s for s, sub in self.subscribers.items() if sub.output ]
+
+            try :
+                readable, writable = select.select( readers, writers, [], 1 )[ : 2 ]
+            except select.error as e :
+                if e.args[0] == errno.EINTR :
+                    continue
+                raise
+
+            for s in readable :
+                if s is self.listener :
+                    self.accept()
+                elif s is self.wakeReader :
+                    self.dispatch()
+                elif s in self.subscribers :
+                    self.receive( self.subscribers[s] )
+
+            for s in writable :
+                if s in self.subscribers :
+                    self.send( self.subscribers[s] )
+
+        for s in self.subscribers.keys() :
+            s.close()
+        self.subscribers = {}
+        self.listener.close()
+        self.wakeReader.close()
+        self.wakeWriter.close()
+
+
+    def accept( self ) :
+
+        try :
+            sock, address = self.listener.accept()
+        except socket.error :
+            return
+
+        sock.setblocking( 0 )
+        self.subscribers[sock] = Subscriber( sock, address )
+
+        if DEBUG:
+            print "Stream subscriber %s:%i connected" % address
+
+
+    def close( self, sub, reason = None ) :
+
+        if DEBUG or reason :
+            print "Stream subscriber %s:%i disconnected %s" % ( sub.address + ( reason or '', ) )
+
+        del self.subscribers[ sub.sock ]
+        sub.sock.close()
+
+
+    def dispatch( self ) :
+        """Send the published samples to their subscribers."""
+
+        try :
+            while self.wakeReader.recv( 4096 ) :
+                pass
+        except socket.error :
+            pass
+
+        lines = {}
+        try :
+            while True :
+                channel, t, value = self.pending.get_nowait()
+                if channel is None :
+                    continue
+                line = '%s;%s;%s\n' % ( repr( float(t) ), channel, repr( float(value) ) )
+                if channel not in self.history :
+                    self.history[channel] = collections.deque( maxlen = self.replay )
+                self.history[channel].append( line )
+                lines.setdefault( channel, [] ).append( line )
+                self.published += 1
+        except Queue.Empty :
+            pass
+
+        for sub in self.subscribers.values() :
+            data = ''.join( [ ''.join( l ) for channel, l in lines.items() if sub.wants( channel ) ] )
+            if data :
+                self.queue( sub, data )
+
+
+    def queue( self, sub, data ) :
+        """Add data to the output of a subscriber, drop it if too slow."""
+
+        sub.output += data
+        if len( sub.output ) > self.maxBuffer :
+            self.dropped += 1
+            self.close( sub, '(too slow)' )
+
+
+    def send( self, sub ) :
+
+        try :
+            n = sub.sock.send( sub.output )
+        except socket.error as e :
+            if e.args[0] not in ( errno.EAGAIN, errno.EWOULDBLOCK ) :
+                self.close( sub )
+            return
+
+        sub.output = sub.output[ n : ]
+
+
+    def receive( self, sub ) :
+
+        try :
+            data = sub.sock.recv( 4096 )
+        except socket.error as e :
+            if e.args[0] not in ( errno.EAGAIN, errno.EWOULDBLOCK ) :
+                self.close( sub )
+            return
+
+        if not data :
+            self.close( sub )
+            return
+
+        sub.input += data
+        lines = sub.input.split( '\n' )
+        sub.input = lines.pop()
+
+        if len( sub.input ) > 4096 :
+            self.close( sub, '(line too long)' )
+            return
+
+        for line in lines :
+            if sub.sock in self.subscribers :
+                self.command( sub, line.strip() )
+
+
+    def command( self, sub, line ) :
+        """Execute a command line of a subscriber."""
+
+        command, sep, channel = line.partition( ' ' )
+        command = command.upper()
+        channel = channel.strip()
+
+        if command == 'SUB' and channel :
+            if channel == '*' :
+                sub.all = True
+                replay = sorted( self.history.items() )
+            else :
+                sub.channels.add( channel )
+                replay = [ ( channel, self.history.get( channel, [] ) ) ]
+            self.queue( sub, ''.join( [ ''.join( h ) for c, h in replay ] ) )
+
+        elif command == 'UNSUB' and channel :
+            if channel == '*' :
+                sub.all = False
+                sub.channels.clear()
+            else :
+                sub.channels.discard( channel )
+
+        elif command == 'CHANNELS' :
+            self.queue( sub, '# channels: %s\n' % ';'.join( sorted( self.history ) ) )
+
+        elif line :
+            self.queue( sub, '# unknown command: %s\n' % line )
@@ -41,127 +41,678 @@
 
 import os
 import re
+import sys
 import time
+import json
+import hashlib
+import traceback
+import multiprocessing
 from optparse import OptionParser
-from pylab import *
+from cStringIO import StringIO
+import numpy
+import matplotlib
+matplotlib.use('Agg') # No window, the plots are only saved, also in worker processes
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.ticker import Formatter
 
 font = {'size'   : 10}
 matplotlib.rc('font', **font)  # pass in the font dict as kwargs
 
 
-def cleanReadingError(x):
-    if 1e-15 < x < 1e-1:
-        return x
-    else:
-        return None
+def cleanReadingError(y):
+    """Replace by NaN the pressures out of the gauges range, i.e. reading errors."""
+    y = numpy.array(y, dtype=float)
+    y[~((1e-15 < y) & (y < 1e-1))] = numpy.nan
+    return y
 
 
 class DateFormatter(Formatter):
-    def __init__(self, dates, dateFormat='%Y-%m-%d'):
-        self.dates = dates
+    # The labels are kept between the draws, the ticks rarely change
+    MAX_LABELS = 1000
+
+    def __init__(self, dateFormat='%Y-%m-%d'):
         self.dateFormat = dateFormat
+        self.labels = {}
 
     def __call__(self, x, pos=0):
-        """Return the label for time x at position pos"""
-        ind = int(round(x))
-        if ind>=len(self.dates) or ind<0: return ''
+        """Return the label for the timestamp x at position pos"""
+        label = self.labels.get(x)
+        if label is None:
+            if len(self.labels) > self.MAX_LABELS:
+                self.labels.clear()
+            label = time.strftime(self.dateFormat, time.localtime(x))
+            self.labels[x] = label
+        return label
+
+
+def readTabFile(f, header):
+    """Old file types, 'Time\tTemperature\tPressure...' columns, time in minutes"""
+    labels = header.rstrip().split('\t')
+    # The number of values of each row is checked, a short row would shift
+    # all the following values to the wrong columns
+    data = numpy.loadtxt(f, ndmin=2)
+    if data.size == 0:
+        data = numpy.zeros((0, len(labels)))
+    elif data.shape[1] != len(labels):
+        raise ValueError('%i values by row for the %i columns %s'
+                         % (data.shape[1], len(labels), ', '.join(labels)))
+    timeaxis = data[:, labels.index('Time')]
+
+    return [(label, timeaxis, data[:, i])
+            for i, label in enumerate(labels) if label != 'Time']
+
+
+def readSemicolonFile(f):
+    """One line per label, 'Time;...' for all the labels or 'label Time;...' for each label"""
+    channels = []
+    timeaxis = numpy.zeros(0)
+    for line in f:
+        label, sep, values = line.partition(';')
+        values = numpy.fromstring(values, sep=';')
+        if label == 'Time' or label.endswith(' Time'):
+            timeaxis = values
+        else:
+            n = min(len(timeaxis), len(values))
+            channels.append((label, timeaxis[:n], values[:n]))
+
+    return channels
+
+
+def parseRows(text, labels):
+    """Convert complete 'Timestamp;Channel;Value' rows to a (n, 3) array.
+
+    The channels are replaced by their index in labels, the new channels
+    are added at the end of labels in the order they appear. Raise
+    ValueError for the first row which has not 3 fields or whose time or
+    value is not a number."""
+    if not text.strip():
+        return numpy.zeros((0, 3))
+
+    known = len(labels)
+    index = dict((label, i) for i, label in enumerate(labels))
+
+    def channelIndex(name):
+        # Whatever the name looks like, i.e. starting with a digit
+        if name not in index:
+            index[name] = len(labels)
+            labels.append(name)
+        return index[name]
+
+    try:
+        data = numpy.loadtxt(StringIO(text), delimiter=';', comments=None,
+                             converters={1: channelIndex}, ndmin=2)
+        if data.shape[1] != 3:
+            raise ValueError('%i fields by row' % data.shape[1])
+    except ValueError as e:
+        del labels[known:]
+        raise ValueError('not a Timestamp;Channel;Value row, %s' % e)
+    return data
+
+
+def readRowFile(f):
+    """Autosave files, 'Timestamp;Channel;Value' rows"""
+    text = f.read()
+    # Only complete rows, the file might be written by the autosave
+    text = text[:text.rfind('\n') + 1]
+
+    labels = []
+    data = parseRows(text, labels)
+
+    channels = []
+    for i, label in enumerate(labels):
+        rows = data[data[:, 1] == i]
+        channels.append((label, rows[:, 0], rows[:, 2]))
+
+    return channels
+
+
+# Bytes read at most to recognize the format of a file
+HEADER_PREFIX = 4096
+
+def readFile(filename):
+    """Read the data of a file with numpy arrays.
+
+    Return (channels, timeInTimestamp) where channels is a list of
+    (label, time, values), or None if the format is unknown."""
+    f = open(filename, 'r')
+    # Only a prefix, the first line of the ';' format is the whole time axis
+    header = f.readline(HEADER_PREFIX)
+
+    try:
+        # Old file types
+        if re.match("^Time\tTemperature\tPressure",header):
+        ## Old file types with 2 pressures, inclueded in same reading pattern
+        #if re.match("^Time\tTemperature\tPressure (LT|Prep)",header):
+            if not header.endswith('\n'):
+                header += f.readline()
+            return readTabFile(f, header), False
+
+        # Autosave files
+        elif re.match("^Timestamp;Channel;Value",header):
+            return readRowFile(f), True
+
+        # New file types, faster to read
+        elif re.match("^([^;\n]* )?Time;",header) :
+            f.seek(0)
+            return readSemicolonFile(f), True
 
-        return time.strftime(self.dateFormat,
-                            time.localtime(float(self.dates[ind])))
+        return None
+    finally:
+        f.close()
 
 
-def generatePlot(filename, quiet=True):
-    if not quiet : print '--> Processing file ' + filename,
+# Change the version when the rendering changes, to render all the files again.
+# formats and sizes (width, height in pixels) of the plots, the first
+# size is written to filename.format and the others to filename_WxH.format
+RENDER_SETTINGS = {'version': 3, 'formats': ['png'], 'sizes': [[800, 600]]}
+
+DPI = 100
+
+# One figure for each process, cleared for each file, so the memory does
+# not grow with the number of files. The figure is not known by pylab.
+_figure = None
 
-    f = open( filename, 'r')
-    lines = f.readlines()
-    header = lines[0]
-
-    data = {}
-    timeaxis = []
-    timeInTimestamp = False # i.e time in seconds
-
-    # Old file types
-    if re.match("^Time\tTemperature\tPressure",header):
-    ## Old file types with 2 pressures, inclueded in same reading pattern
-    #if re.match("^Time\tTemperature\tPressure (LT|Prep)",header):
-        labels = header.rstrip().split('\t')
-        for label in labels:
-            data[label] = []
-
-        for line in lines[1:] :
-            x = line.rstrip().split()
-            for i,label in enumerate(labels):
-                data[label].append(x[i])
-
-    # New file types, faster to read
-    elif re.match("^Time;",header) :
-        timeInTimestamp = True
-        for line in lines:
-            content = line.rstrip().split(';')
-            label = content[0]
-            data[label] = content[1:]
 
+def outputNames(filename, settings=RENDER_SETTINGS):
+    """Return the list of ((width, height), format, name) of the plots of filename."""
+    names = []
+    for i, (width, height) in enumerate(settings['sizes']):
+        suffix = '' if i == 0 else '_%ix%i' % (width, height)
+        for format in settings['formats']:
+            names.append(((width, height), format, '%s%s.%s' % (filename, suffix, format)))
+    return names
+
+
+def figure():
+    """Return the empty figure of this process."""
+    global _figure
+    if _figure is None:
+        _figure = Figure(dpi=DPI)
+        FigureCanvasAgg(_figure)
     else:
-        f.close()
+        _figure.clf()
+    return _figure
+
+
+def readRollups(filename, columns):
+    """Read the channels from the rollup files written with filename.
+
+    For each channel the coarsest tier with at least columns buckets is
+    read, as min/max pairs. Return None if there are no rollups or if a
+    channel needs the raw samples, see readFile for the returned value."""
+    from controllers.storage import openRollups
+    from controllers.rollups import selectResolution, TIME, MIN, MAX
+
+    log = openRollups(os.path.splitext(filename)[0])
+    if not log:
+        return None
+
+    channels = []
+    for label, tiers in sorted(log.items()):
+        tiers = dict((r, rows) for r, rows in tiers.items() if len(rows))
+        if not tiers:
+            continue
+        start = min(rows[0, TIME] for rows in tiers.values())
+        stop = max(rows[-1, TIME] + r for r, rows in tiers.items())
+        r = selectResolution(tiers.keys(), start, stop, columns)
+        if r is None:
+            return None
+
+        rows = tiers[r]
+        timeaxis = numpy.repeat(rows[:, TIME] + r / 2., 2)
+        y = numpy.empty(len(timeaxis))
+        y[0::2] = rows[:, MIN]
+        y[1::2] = rows[:, MAX]
+        channels.append((label, timeaxis, y))
+
+    return channels, True
+
+
+def generatePlot(filename, quiet=True, settings=RENDER_SETTINGS):
+    if not quiet : print '--> Processing file ' + filename,
+
+    # Long runs are plotted from their rollups, without reading the samples
+    content = readRollups(filename, max(width for width, height in settings['sizes']))
+    if content is None:
+        content = readFile(filename)
+    if content is None or not any(len(t) for label, t, y in content[0]):
         if not quiet : print ' unknown format, dropped'
         return
 
-    timeaxis = data.pop('Time')
-    figure, axarr = subplots(len(data), sharex=True)
-
-    if timeInTimestamp:
-        dates = timeaxis
-        timeaxis = range(len(timeaxis))
-        formatter = DateFormatter(dates, dateFormat='%d %H:%M')
-        year = time.strftime('%Y/%m/',
-                time.localtime(float(dates[0])))
+    channels, timeInTimestamp = content
+    drawChannels(filename, channels, timeInTimestamp, settings)
 
-    for i,label in enumerate(data):
-        if len(data) == 1 :
-            p = axarr
+    if not quiet : print ' finished'
+    return channels
+
+
+def drawChannels(filename, channels, timeInTimestamp, settings=RENDER_SETTINGS):
+    """Draw the (label, time, values) channels to the plots of filename."""
+    fig = figure()
+
+    try:
+        p = None
+        for i,(label, timeaxis, y) in enumerate(channels):
+            p = fig.add_subplot(len(channels), 1, i + 1, sharex=p)
+            if label == "Temperature":
+                p.set_ylabel(r"Temperature [$^o$C]")
+            elif re.match("^Pressure",label):
+                y = cleanReadingError(y)
+                p.set_yscale('log')
+                p.set_ylabel(label + " [mbar]")
+
+            p.plot(timeaxis, y, 'g-', linewidth=2)
+            p.grid(True)
+
+        # Only the bottom axis has tick labels, as with subplots(sharex=True)
+        for q in fig.axes[:-1]:
+            for tick in q.get_xticklabels():
+                tick.set_visible(False)
+
+        if timeInTimestamp:
+            p.xaxis.set_major_formatter(DateFormatter(dateFormat='%d %H:%M'))
+            fig.autofmt_xdate()
+            start = min(timeaxis[0] for label, timeaxis, y in channels if len(timeaxis))
+            p.set_xlabel(time.strftime('%Y/%m/', time.localtime(start)))
         else:
-            p = axarr[i]
-        y = map(float, data[label])
-        if label == "Temperature":
-            p.set_ylabel(r"Temperature [$^o$C]")
-        elif re.match("^Pressure",label):
-            y = map(cleanReadingError, y)
-            p.set_yscale('log')
-            p.set_ylabel(label + " [mbar]")
-
-        p.plot(timeaxis[:min(len(y),len(timeaxis))],
-               y[:min(len(y),len(timeaxis))],'g-',linewidth=2)
-        p.grid('on')
-
-    if timeInTimestamp:
-        p.xaxis.set_major_formatter(formatter)
-        figure.autofmt_xdate()
-        p.set_xlabel("%s" % year)
-    else:
-        p.set_xlabel("Time [min]")
+            p.set_xlabel("Time [min]")
+
+        # All the formats and sizes from the same parse and the same axes
+        for (width, height), format, name in outputNames(filename, settings):
+            fig.set_size_inches(width / float(DPI), height / float(DPI))
+            # Replace the plot at once, it might be served while it is written
+            fig.savefig(name + '.tmp', format=format, dpi=DPI)
+            try:
+                os.rename(name + '.tmp', name)
+            except OSError:
+                # Windows does not replace an existing file
+                os.remove(name)
+                os.rename(name + '.tmp', name)
+    finally:
+        # Free the lines and their data before the next file
+        fig.clf()
+
+# Cache manifest of the rendered files, one in each directory
+CACHE_NAME = '.generatePlots.cache'
+
+def fileDigest(filename):
+    """Return the SHA-1 of the content of filename, read by blocks."""
+    digest = hashlib.sha1()
+    f = open(filename, 'rb')
+    for block in iter(lambda: f.read(1 << 20), ''):
+        digest.update(block)
+    f.close()
+    return digest.hexdigest()
+
+
+def cacheEntry(filename, settings):
+    """Return the cache manifest entry describing the current filename."""
+    st = os.stat(filename)
+    return {'size': st.st_size, 'mtime': st.st_mtime,
+            'sha1': fileDigest(filename), 'settings': settings}
+
+
+def isUpToDate(filename, entry, settings):
+    """Return True if the plot of filename was rendered from the same
+    content with the same settings. The content is only hashed if the
+    size matches but not the modification time, i.e. a copied file."""
+    if entry is None or entry.get('settings') != settings:
+        return False
+    for size, format, name in outputNames(filename, settings):
+        if not os.path.exists(name):
+            return False
+
+    st = os.stat(filename)
+    if entry['size'] != st.st_size:
+        return False
+    if entry['mtime'] == st.st_mtime:
+        return True
+    return entry['sha1'] == fileDigest(filename)
+
+
+def loadCache(directory):
+    try:
+        f = open(os.path.join(directory, CACHE_NAME), 'r')
+    except IOError:
+        return {}
+    try:
+        return json.load(f)
+    except ValueError:
+        return {}
+    finally:
+        f.close()
+
 
-    savefig(filename+".png")
+def saveCache(directory, cache):
+    filename = os.path.join(directory, CACHE_NAME)
+    f = open(filename + '.tmp', 'w')
+    json.dump(cache, f, indent=1, sort_keys=True)
     f.close()
+    # Never leave a half written manifest, nor none if interrupted
+    try:
+        os.rename(filename + '.tmp', filename)
+    except OSError:
+        # Windows does not replace an existing file
+        os.remove(filename)
+        os.rename(filename + '.tmp', filename)
+
+
+def renderFile(task):
+    """Call generatePlot on one file and never raise, to be used in a process pool.
+
+    task is (filename, cache entry or None, settings), the file is not
+    rendered if it is up to date with the cache entry. Return (filename,
+    status, seconds, size, new cache entry) where status is 'finished',
+    'unchanged', 'dropped' for unknown formats or the error message."""
+
+    filename, entry, settings = task
+    start = time.time()
+    size = 0
+    try:
+        if isUpToDate(filename, entry, settings):
+            status = 'unchanged'
+            # The content is the same, a copy or touch only changes the time
+            entry = dict(entry, mtime=os.stat(filename).st_mtime)
+        else:
+            entry = cacheEntry(filename, settings)
+            size = entry['size']
+            if generatePlot(filename, settings=settings) is None:
+                status = 'dropped'
+                entry = None
+            else:
+                status = 'finished'
+    except Exception:
+        entry = None
+        status = traceback.format_exc().strip().splitlines()[-1]
+
+    return filename, status, time.time() - start, size, entry
+
+
+class LogFollower(object):
+    """Follow a log file growing while it is written, e.g. by the autosave.
+
+    For the autosave files only the bytes appended since the last update
+    are parsed and the samples are added to growing buffers, so an update
+    costs the new data and not the size of the file. The other formats
+    are read again when they change, they are rewritten at each save.
+    If the file is replaced or truncated, it is read again from the start."""
+
+    # Bytes at the beginning of the file compared to detect a new file
+    PREFIX_SIZE = 4096
+
+    def __init__(self, filename):
+        self.filename = filename
+        # Changed when the file is read again from the start
+        self.generation = 0
+        self.reset()
+
+    def reset(self):
+        self.generation += 1
+        self.offset = 0
+        self.size = 0
+        self.mtime = None
+        self.inode = None
+        self.prefix = ''
+        self.incremental = False
+        self.labels = []
+        self.buffers = {}
+        self.content = None
+
+    def isRewritten(self, f, st):
+        if self.inode is None:
+            return False
+        if st.st_ino != self.inode or st.st_size < self.size:
+            return True
+        f.seek(0)
+        return f.read(len(self.prefix)) != self.prefix
+
+    def update(self):
+        """Read the changes of the file, return True if there are new samples."""
+        try:
+            st = os.stat(self.filename)
+            f = open(self.filename, 'rb')
+        except (IOError, OSError):
+            return False
+
+        try:
+            if self.isRewritten(f, st):
+                self.reset()
+            elif st.st_size == self.size and st.st_mtime == self.mtime:
+                return False
+
+            self.inode = st.st_ino
+            self.size = st.st_size
+            self.mtime = st.st_mtime
+
+            if self.offset == 0:
+                f.seek(0)
+                header = f.readline(HEADER_PREFIX)
+                if not header.endswith('\n') and len(header) < HEADER_PREFIX:
+                    # The header is not written yet
+                    self.inode = None
+                    return False
+                self.incremental = re.match("^Timestamp;Channel;Value", header) is not None
+                self.offset = len(header)
+
+            if not self.incremental:
+                self.content = readFile(self.filename)
+                f.seek(0)
+                self.prefix = f.read(self.PREFIX_SIZE)
+                return self.content is not None
+
+            f.seek(self.offset)
+            text = f.read(st.st_size - self.offset)
+            # Only complete rows, the last one is parsed at the next update
+            text = text[:text.rfind('\n') + 1]
+            if len(self.prefix) < self.PREFIX_SIZE:
+                f.seek(0)
+                self.prefix = f.read(min(self.offset + len(text), self.PREFIX_SIZE))
+            self.offset += len(text)
+            if not text:
+                return False
+
+            from controllers.samples import SampleBuffer
+            data = parseRows(text, self.labels)
+            for i, label in enumerate(self.labels):
+                rows = data[data[:, 1] == i]
+                if label not in self.buffers:
+                    self.buffers[label] = SampleBuffer()
+                if len(rows):
+                    self.buffers[label].extend(rows[:, 0], rows[:, 2])
+            return len(data) > 0
+        finally:
+            f.close()
+
+    def channels(self):
+        """Return (channels, timeInTimestamp) as readFile, or None."""
+        if not self.incremental:
+            return self.content
+        return [(label, self.buffers[label].x, self.buffers[label].y)
+                for label in self.labels], True
+
+
+class ColumnBins(object):
+    """Min/max of a growing channel in at most columns time buckets.
+
+    The samples are added to a rollups.Tier whose resolution is a power of
+    two seconds. When the time span does not fit in columns buckets any
+    more, the resolution is doubled and the new tier is made from the
+    min/max pairs of the old one, two buckets becoming one, so an update
+    only reads the new samples."""
+
+    def __init__(self, columns, validRange=None):
+        self.columns = columns
+        self.validRange = validRange
+        self.tier = None
+        self.start = None
+
+    def extend(self, t, y):
+        from controllers.rollups import Tier
+
+        if not len(t):
+            return
+        if self.tier is None:
+            self.start = t[0]
+            span = max(t[-1] - t[0], 1.)
+            self.tier = Tier(2. ** numpy.floor(numpy.log2(span / self.columns)),
+                             validRange=self.validRange)
+
+        resolution = self.tier.resolution
+        while (t[-1] - (self.start - self.start % resolution)) / resolution >= self.columns:
+            resolution *= 2
+        if resolution != self.tier.resolution:
+            x, pairs = self.tier.minMax()
+            self.tier = Tier(resolution, validRange=self.validRange)
+            self.tier.extend(x, pairs)
+
+        self.tier.extend(t, y)
+
+    def curve(self):
+        """Return the times and values of the min/max pairs."""
+        if self.tier is None:
+            return numpy.zeros(0), numpy.zeros(0)
+        return self.tier.minMax()
+
+
+def watch(filenames, interval, settings=RENDER_SETTINGS, quiet=True):
+    """Render the files when they change, at most every interval seconds."""
+    from controllers.rollups import validRange
+
+    followers = [LogFollower(filename) for filename in filenames]
+    # One min/max pair by pixel column is enough for the largest plot
+    columns = max(width for width, height in settings['sizes'])
+    # (filename, label) -> (generation of the follower, ColumnBins, samples binned)
+    binned = {}
+
+    while True:
+        start = time.time()
+        for follower in followers:
+            try:
+                if not follower.update():
+                    continue
+            except ValueError as e:
+                # The rows are skipped, the following ones are still read
+                print '%s : %s' % (follower.filename, e)
+                continue
+            content = follower.channels()
+            if content is None or not any(len(t) for label, t, y in content[0]):
+                continue
+            channels = []
+            for label, t, y in content[0]:
+                key = (follower.filename, label)
+                generation, bins, count = binned.get(key, (None, None, 0))
+                # Only the autosave files grow, the others are read again
+                if generation != follower.generation or not follower.incremental:
+                    # The pressure errors are skipped, they are not extrema
+                    bins, count = ColumnBins(columns, validRange(label)), 0
+                bins.extend(t[count:], y[count:])
+                binned[key] = (follower.generation, bins, len(t))
+                channels.append((label,) + bins.curve())
+            try:
+                drawChannels(follower.filename, channels, content[1], settings)
+            except Exception:
+                print '%s : %s' % (follower.filename, traceback.format_exc().strip().splitlines()[-1])
+                continue
+            if not quiet : print '--> %s rendered %s (%.1f s)' % (
+                time.strftime('%H:%M:%S'), follower.filename, time.time() - start)
+
+        time.sleep(max(interval - (time.time() - start), 0))
 
-    if not quiet : print ' finished'
-    return timeaxis,data
 
 def main() :
     """Allow to use this script as a *nix command line program."""
 
     parser = OptionParser(usage="usage: %prog [options] [filename(s)]")
     parser.add_option("-q", "--quiet", action="store_true", default=False, dest="quiet", help="Be quiet")
+    parser.add_option("-j", "--jobs", type="int", default=1, dest="jobs",
+        help="Number of files rendered in parallel, 0 for one per CPU [default: %default]")
+    parser.add_option("-f", "--force", action="store_true", default=False, dest="force",
+        help="Render all the files, even the ones not changed since the last run")
+    parser.add_option("-t", "--formats", default="png", dest="formats",
+        help="Output formats, comma separated, e.g. png,pdf,svg [default: %default]")
+    parser.add_option("-s", "--sizes", default="800x600", dest="sizes",
+        help="Output sizes in pixels, comma separated, e.g. 800x600,1600x1200 [default: %default]")
+    parser.add_option("-w", "--watch", action="store_true", default=False, dest="watch",
+        help="Follow the files while they are written and render them when they change")
+    parser.add_option("-i", "--interval", type="float", default=60, dest="interval",
+        help="Minimum time between two renderings in watch mode, in seconds [default: %default]")
     (options, args) = parser.parse_args()
 
     if not args :
         parser.error("No file specified")
 
     fileslist = args
+    jobs = options.jobs or multiprocessing.cpu_count()
+    try :
+        sizes = [map(int, size.lower().split('x')) for size in options.sizes.split(',')]
+    except ValueError :
+        parser.error("Invalid sizes %s" % options.sizes)
+    if any(len(size) != 2 for size in sizes) :
+        parser.error("Invalid sizes %s" % options.sizes)
+    settings = dict(RENDER_SETTINGS, formats=options.formats.split(','), sizes=sizes)
+
+    if options.watch :
+        watch(fileslist, options.interval, settings, options.quiet)
+        return
 
+    start = time.time()
+
+    caches = {}
+    tasks = []
     for filename in fileslist :
-        generatePlot(filename, quiet = options.quiet)
+        directory, name = os.path.split(os.path.abspath(filename))
+        if directory not in caches :
+            caches[directory] = loadCache(directory)
+        entry = None if options.force else caches[directory].get(name)
+        tasks.append((filename, entry, settings))
+
+    if jobs > 1 :
+        pool = multiprocessing.Pool(jobs)
+        # imap keeps the order of the files, while they are rendered in parallel
+        results = pool.imap(renderFile, tasks)
+    else :
+        pool = None
+        results = (renderFile(task) for task in tasks)
+
+    failed = []
+    unchanged = 0
+    megabytes = 0
+    for filename, status, seconds, size, entry in results :
+        if not options.quiet : print '--> Processing file %s %s (%.1f s)' % (filename, status, seconds)
+
+        directory, name = os.path.split(os.path.abspath(filename))
+        if entry is None :
+            caches[directory].pop(name, None)
+        else :
+            caches[directory][name] = entry
+
+        if status == 'finished':
+            megabytes += size / 1e6
+        elif status == 'unchanged':
+            unchanged += 1
+        else:
+            failed.append((filename, status))
+
+    if pool is not None :
+        pool.close()
+        pool.join()
+
+    for directory, cache in caches.items() :
+        try :
+            saveCache(directory, cache)
+        except (IOError, OSError) :
+            print 'Cannot write the cache manifest in %s' % directory
+
+    elapsed = max(time.time() - start, 1e-6)
+    print '%i file(s), %i unchanged, %.1f MB rendered in %.1f s : %.2f files/s, %.2f MB/s, %i job(s)' % (
+        len(fileslist), unchanged, megabytes, elapsed, len(fileslist) / elapsed, megabytes / elapsed, jobs)
+
+    if failed :
+        print '%i file(s) not rendered :' % len(failed)
+        for filename, status in failed :
+            print '    %s : %s' % (filename, status)
+        sys.exit(1)
 
 if __name__ == "__main__":
     try :
@@ -49,14 +49,27 @@
 
 """
 
+import time
+# Beginning of the startup, see startupReport
+STARTED = time.time()
+
 import sys
 import os
-import time
+import socket
+from optparse import OptionParser
 from PyQt4 import Qt
 import PyQt4.Qwt5 as Qwt
 import serial
 
-from controllers import *
+# The controllers plot modules are imported by config.controllerModule
+# only for the setup used
+from controllers import config
+from controllers.redraw import RedrawScheduler
+from controllers.acquisition import Acquisition
+from controllers.storage import RowWriter, BinaryWriter, RollupWriter, readSamples
+from controllers.streaming import StreamServer, DEFAULT_PORT
+from controllers import metrics
+from controllers.profiler import PROFILER
 
 DEBUG = False
 
@@ -70,50 +83,66 @@ class BakeoutControllerWindow( Qt.QMainWindow ) :
         with some toolbars and menus.
     """
 
-    def __init__( self, *args ) :
-        """Constructor, put the widgets together and launch method for creating menubars and toolbars """
+    def __init__( self, setup = config.DEFAULT_SETUP, *args ) :
+        """Constructor, put the widgets together and launch method for creating menubars and toolbars
+
+            setup is the name of the lab setup in controllers/config.py.
+        """
 
         Qt.QMainWindow.__init__( self, *args )
 
         # FIXME add a GUI way to change the available controllers.
         #
-        # For now, you simply have to edit the list below to add, remove or change controllers
-        # In case the same serial port is used (daisy chaining like on the IGC3, refer to the right
-        # serial port from the other controller with something like as 3rd argument:
-        #
-        #       self.plots[_tr('Pressure LT')] = IGC3( '\x01', 'LT' )
-        #       self.plots[_tr('Pressure Prep')] = IGC3( '\x02', 'Prep', self.plots[_tr('Pressure LT')].initSerial() )
-        #
-        # On Windows it seems that the port 0 is unused, or it might depends on our own configuration.
+        # For now, you simply have to edit the setups in controllers/config.py to add, remove
+        # or change controllers, and select the default setup there.
         #
         self.plots = {}
 
-        # Do a basic kind of switch for the possible configuration in our lab
-        which = 'LT-STM'
-        
-        # NOTE This is a special case for our Omicron STM lab, as exemple
-        if 'LT-STM' == which:
-            self.plots[_tr('Temperature')] = Lakeshore331.Controller( serialPort = 'COM15')
-            self.plots[_tr('Pressure LT')] = IGC3.Controller( '\x01', 'LT', serialPort = 'COM14')
-            self.plots[_tr('Pressure Prep')] = IGC3.Controller( '\x02', 'Prep', self.plots[_tr('Pressure LT')].initSerial() )
-
-        # NOTE This is a special case for our JT-STM lab, as exemple
-        elif 'JT-STM' == which:
-            self.plots[_tr('Pressure JT')] = MVC3.Controller( 'JT', serialPort = 1 )
-            self.plots[_tr('Pressure JT')].initSerial()
-
-        # NOTE This is an example to use this program with a LHe meter, as exemple
-        elif 'LHeMeter' == which:
-            self.plots[_tr('Liquid Helium Depth')] = HeLevelPlot.Controller( serialPort = 1)
-
-        else:
+        which = setup
+
+        if which not in config.SETUPS :
             print 'Woups... no plots defined or wrong name selected ? are you sure.'
             return
 
+        for c in config.SETUPS[which] :
+            args = config.arguments( c, keepName = True )
+            if 'bus' in c :
+                # Daisy chained controllers share the serial port
+                args['serial'] = self.plots[ _tr(c['bus']) ].device.initSerial()
+
+            module = config.controllerModule( c['type'] )
+            self.plots[ _tr(c['channel']) ] = module.Controller( **args )
+            self.plots[ _tr(c['channel']) ].channel = _tr(c['channel'])
+
         # Store if we need to clean the plot on next run
         self.clearPlots = False
         self.autoSaveTimer = None
 
+        # Autosave appends the samples received since the last autosave
+        self.autoSaveWriters = []
+        self.unsavedSamples = []
+
+        # Serial I/O runs in background threads, the samples are collected
+        # from the acquisition queue by a GUI timer
+        self.acquisition = Acquisition()
+        for name,p in self.plots.items() :
+            self.acquisition.addDevice( name, p.device )
+        self.collectTimer = None
+
+        # Live samples for the other programs, started with the measurement
+        self.stream = None
+        # I/O metrics of the devices on a local port, also started with the measurement
+        self.metricsServer = None
+
+        # File being opened, see openFile
+        self.loader = None
+        self.loadTimer = None
+
+        # Repaint all the plots together at a limited frame rate
+        self.redraw = RedrawScheduler( self )
+        for p in self.plots.values() :
+            p.scheduler = self.redraw
+
         widget = Qt.QWidget( self )
         layout = Qt.QVBoxLayout()
 
@@ -124,16 +153,37 @@ class BakeoutControllerWindow( Qt.QMainWindow ) :
         self.setCentralWidget( widget )
 
         self.makeConfigWidget()
+        self.makeDiagnosticsWidget()
         self.makeAction()
         self.makeMenuBars()
         self.makeToolBars()
 
         self.setWindowTitle( _tr('Lab monitoring[*]') )
         self.setWindowIcon( Qt.QIcon("img/app.svg") )
-        self.statusBar().showMessage( _tr('Ready') )
+
+        self.busLabel = Qt.QLabel()
+        self.statusBar().addPermanentWidget( self.busLabel )
+
+        self.redrawLabel = Qt.QLabel()
+        self.statusBar().addPermanentWidget( self.redrawLabel )
+        Qt.QObject.connect( self.redraw, Qt.SIGNAL( "redrawn(double)" ), self.showRedrawCost )
 
         self.resize(600, 500)
 
+        self.startupTime = time.time() - STARTED
+        self.statusBar().showMessage( _tr('Ready, started in %.2f s') % self.startupTime )
+
+
+    def startupReport( self ) :
+        """Return a text report of the time spent to start the program."""
+
+        lines = [ _tr('Startup in %.3f s') % self.startupTime ]
+        for controllerType, seconds in sorted( config.IMPORT_TIMES.items(), key = lambda i : -i[1] ) :
+            lines.append( _tr('    import %-20s %.3f s') % ( controllerType, seconds ) )
+        lines.append( _tr('    %i controller type(s) not imported') % ( len( config.CONTROLLERS ) - len( config.IMPORT_TIMES ) ) )
+
+        return '\n'.join( lines )
+
 
     def makeConfigWidget( self ) :
         """Create the configuration dock with all the options for the controllers and autosave """
@@ -144,12 +194,47 @@ class BakeoutControllerWindow( Qt.QMainWindow ) :
         configLayout = Qt.QFormLayout()
 
         self.intervalSpinBox = Qt.QDoubleSpinBox()
-        Qt.QObject.connect( self.intervalSpinBox, Qt.SIGNAL( "valueChanged(double)" ), self.setInterval )
         self.intervalSpinBox.setSuffix( _tr(' min') )
         self.intervalSpinBox.setDecimals( 1 )
         self.intervalSpinBox.setValue( 1 )
         configLayout.addRow( _tr('&Readout interval'), self.intervalSpinBox )
 
+        # Faster readout of the channels changing quickly, slower on plateaus
+        self.adaptiveCheckBox = Qt.QCheckBox()
+        self.adaptiveCheckBox.setToolTip( _tr('The readout interval is the longest one') )
+        configLayout.addRow( _tr('Ada&ptive readout'), self.adaptiveCheckBox )
+
+        self.minIntervalSpinBox = Qt.QDoubleSpinBox()
+        self.minIntervalSpinBox.setRange( 0.1, 3600 )
+        self.minIntervalSpinBox.setSuffix( _tr(' s') )
+        self.minIntervalSpinBox.setDecimals( 1 )
+        self.minIntervalSpinBox.setValue( 5 )
+        configLayout.addRow( _tr('&Shortest interval'), self.minIntervalSpinBox )
+
+        self.toleranceSpinBox = Qt.QDoubleSpinBox()
+        self.toleranceSpinBox.setRange( 0.01, 100 )
+        self.toleranceSpinBox.setSuffix( _tr(' %') )
+        self.toleranceSpinBox.setValue( 1 )
+        self.toleranceSpinBox.setToolTip( _tr('Relative change between two samples, faster readout above') )
+        configLayout.addRow( _tr('Change &tolerance'), self.toleranceSpinBox )
+
+        # Maximum number of samples kept in memory per plot, 0 = unlimited
+        self.historySpinBox = Qt.QSpinBox()
+        self.historySpinBox.setRange( 0, 10000000 )
+        self.historySpinBox.setSingleStep( 1000 )
+        self.historySpinBox.setSpecialValueText( _tr('Unlimited') )
+        self.historySpinBox.setSuffix( _tr(' samples') )
+        Qt.QObject.connect( self.historySpinBox, Qt.SIGNAL( "valueChanged(int)" ), self.setHistoryLength )
+        configLayout.addRow( _tr('Max &history'), self.historySpinBox )
+
+        self.fpsSpinBox = Qt.QDoubleSpinBox()
+        self.fpsSpinBox.setRange( 0.1, 30 )
+        self.fpsSpinBox.setDecimals( 1 )
+        self.fpsSpinBox.setValue( 2 )
+        self.fpsSpinBox.setSuffix( _tr(' /s') )
+        Qt.QObject.connect( self.fpsSpinBox, Qt.SIGNAL( "valueChanged(double)" ), self.setMaxFps )
+        configLayout.addRow( _tr('Max &redraw rate'), self.fpsSpinBox )
+
         self.autoSaveCheckBox = Qt.QCheckBox()
         self.autoSaveCheckBox.setCheckState(Qt.Qt.Checked)
         configLayout.addRow( _tr('&Autosave enabled'), self.autoSaveCheckBox )
@@ -163,11 +248,80 @@ class BakeoutControllerWindow( Qt.QMainWindow ) :
         self.autoSaveDirEdit = Qt.QLineEdit( Qt.QDir.home().path() )
         configLayout.addRow( _tr('Autosave &directory'), self.autoSaveDirEdit )
 
+        # Also write a memory mapped binary log, fast to open for long runs
+        self.binaryLogCheckBox = Qt.QCheckBox()
+        configLayout.addRow( _tr('Autosave &binary log'), self.binaryLogCheckBox )
+
+        # Min, max and mean by minute, 10 minutes and hour, for generatePlots
+        self.rollupsCheckBox = Qt.QCheckBox()
+        self.rollupsCheckBox.setCheckState( Qt.Qt.Checked )
+        configLayout.addRow( _tr('Autosave &rollups'), self.rollupsCheckBox )
+
+        # Publish the samples on a local TCP port, see controllers/streaming.py
+        self.streamCheckBox = Qt.QCheckBox()
+        configLayout.addRow( _tr('&Stream samples'), self.streamCheckBox )
+
+        self.streamPortSpinBox = Qt.QSpinBox()
+        self.streamPortSpinBox.setRange( 1024, 65535 )
+        self.streamPortSpinBox.setValue( DEFAULT_PORT )
+        configLayout.addRow( _tr('Stream &port'), self.streamPortSpinBox )
+
+        # Serve the I/O metrics of the devices, see controllers/metrics.py
+        self.metricsCheckBox = Qt.QCheckBox()
+        configLayout.addRow( _tr('Serve &metrics'), self.metricsCheckBox )
+
+        self.metricsPortSpinBox = Qt.QSpinBox()
+        self.metricsPortSpinBox.setRange( 1024, 65535 )
+        self.metricsPortSpinBox.setValue( metrics.DEFAULT_PORT )
+        configLayout.addRow( _tr('Metrics p&ort'), self.metricsPortSpinBox )
+
         configWidget.setLayout( configLayout )
         self.configDock.setWidget( configWidget )
         self.configDock.setVisible( False )
 
 
+    def makeDiagnosticsWidget( self ) :
+        """Create the dock with the I/O metrics of each device """
+
+        self.diagnosticsDock = Qt.QDockWidget( _tr('Diagnostics') )
+        self.diagnosticsDock.setObjectName( "DiagnosticsDock" )
+        self.addDockWidget( Qt.Qt.BottomDockWidgetArea, self.diagnosticsDock )
+
+        self.diagnosticsColumns = [ _tr('Queries'), _tr('Failures'), _tr('Timeouts'), _tr('Empty'),
+            _tr('Retries'), _tr('CRC errors'), _tr('Parse errors'), _tr('Sent'), _tr('Received'),
+            _tr('Latency'), _tr('50 %'), _tr('95 %') ]
+
+        self.diagnosticsTable = Qt.QTableWidget( len( self.plots ), len( self.diagnosticsColumns ) )
+        self.diagnosticsTable.setHorizontalHeaderLabels( self.diagnosticsColumns )
+        self.diagnosticsTable.setVerticalHeaderLabels( sorted( self.plots.keys() ) )
+        self.diagnosticsTable.setEditTriggers( Qt.QAbstractItemView.NoEditTriggers )
+
+        self.diagnosticsDock.setWidget( self.diagnosticsTable )
+        self.diagnosticsDock.setVisible( False )
+        self.diagnosticsTime = 0
+
+
+    def showDiagnostics( self ) :
+        """Update the I/O metrics shown in the diagnostics dock, once per second """
+
+        if not self.diagnosticsDock.isVisible() or time.time() - self.diagnosticsTime < 1 :
+            return
+        self.diagnosticsTime = time.time()
+
+        def ms( seconds ) :
+            if seconds is None :
+                return '-'
+            return _tr('%.0f ms') % ( seconds * 1e3 )
+
+        for row, name in enumerate( sorted( self.plots.keys() ) ) :
+            m = self.plots[name].device.metrics
+            values = [ m.queries, m.failures, m.timeouts, m.emptyReplies, m.retries,
+                m.crcErrors, m.parseErrors, m.bytesSent, m.bytesReceived,
+                ms( m.meanLatency() ), ms( m.latencyQuantile( 0.5 ) ), ms( m.latencyQuantile( 0.95 ) ) ]
+            for column, value in enumerate( values ) :
+                self.diagnosticsTable.setItem( row, column, Qt.QTableWidgetItem( str( value ) ) )
+
+
     def makeAction( self ) :
         """Create all the actions used on the toolbars and menus """
 
@@ -216,6 +370,20 @@ class BakeoutControllerWindow( Qt.QMainWindow ) :
         self.configureAct.setIcon( Qt.QIcon('img/config.svg') )
         self.configureAct.setText( _tr('Show options') )
 
+        self.diagnosticsAct = self.diagnosticsDock.toggleViewAction()
+        self.diagnosticsAct.setText( _tr('Show diagnostics') )
+
+
+        # Only in the menu when the profiler is enabled, see --profile
+        self.profileReportAct = Qt.QAction( _tr('Profile report...'), self )
+        Qt.QObject.connect( self.profileReportAct, Qt.SIGNAL( "triggered()" ),
+            self.showProfileReport )
+
+
+        self.profileDumpAct = Qt.QAction( _tr('Dump profile trace...'), self )
+        Qt.QObject.connect( self.profileDumpAct, Qt.SIGNAL( "triggered()" ),
+            self.dumpProfileTrace )
+
 
     def makeToolBars( self ) :
         """Create the toolbars """
@@ -261,22 +429,93 @@ class BakeoutControllerWindow( Qt.QMainWindow ) :
 
         self.configMenu = self.menuBar().addMenu( _tr('&Configuration') )
         self.configMenu.addAction( self.configureAct )
+        self.configMenu.addAction( self.diagnosticsAct )
+
+        if PROFILER.enabled :
+            self.configMenu.addSeparator()
+            self.configMenu.addAction( self.profileReportAct )
+            self.configMenu.addAction( self.profileDumpAct )
+            PROFILER.stallCallback = self.showStall
 
     def openFile( self ) :
+        """Load a saved file in the plots, a measurement can then be continued """
 
-        filename = Qt.QFileDialog.getSaveFileName( self, _tr('Open file'), Qt.QDir.home().path() )
+        if self.startAct.isChecked() :
+            Qt.QMessageBox.warning( self, _tr('Open file'), _tr( "Stop the measurement before opening a file." ) )
+            return
+
+        if self.isWindowModified() :
+            r = Qt.QMessageBox.warning( self, _tr('Save current plots ?'), _tr( "The current plots were not saved." ), Qt.QMessageBox.Save | Qt.QMessageBox.Discard | Qt.QMessageBox.Cancel, Qt.QMessageBox.Save )
+
+            if r == Qt.QMessageBox.Save :
+                self.saveAs()
+            elif r == Qt.QMessageBox.Cancel :
+                return
+
+        filename = Qt.QFileDialog.getOpenFileName( self, _tr('Open file'), Qt.QDir.home().path() )
 
         if filename == '' :
             return
 
-        f = open( filename, 'r')
-        lines = f.readlines()
+        try :
+            self.loader = readSamples( str(filename) )
+        except ( IOError, ValueError ) :
+            Qt.QMessageBox.critical( self, _tr( "Critical error" ), _tr( "Cannot open the file :\n\n%s" ) % sys.exc_info()[1] , Qt.QMessageBox.Ok )
+            return
+
+        for p in self.plots.values() :
+            p.initCurve()
+
+        # The file is read by chunks in loadChunk, called by the timer when
+        # the event loop is idle so the window stays responsive
+        self.ignoredChannels = set()
+        self.startAct.setEnabled( False )
+        self.openAct.setEnabled( False )
+        self.loadTimer = self.startTimer( 0 )
+        self.statusBar().showMessage( _tr('Loading %s') % filename )
+
+
+    def loadChunk( self ) :
+        """Add the next chunk of the file being opened to the plots """
+
+        try :
+            with PROFILER.stage( 'load' ) :
+                channel, times, values = self.loader.next()
+
+        except StopIteration :
+            self.finishLoading( _tr('Loaded') )
+            return
+
+        except ( IOError, ValueError ) :
+            self.finishLoading( _tr('Loading failed') )
+            Qt.QMessageBox.critical( self, _tr( "Critical error" ), _tr( "Cannot read the file :\n\n%s" ) % sys.exc_info()[1] , Qt.QMessageBox.Ok )
+            return
+
+        if channel in self.plots :
+            self.plots[channel].addSamples( times, values )
+        else :
+            self.ignoredChannels.add( channel )
+
+
+    def finishLoading( self, message ) :
+        """Stop loading a file and allow to continue the measurement """
+
+        self.killTimer( self.loadTimer )
+        self.loadTimer = None
+        self.loader = None
+
+        self.startAct.setEnabled( True )
+        self.openAct.setEnabled( True )
+        self.clearPlots = False
+        self.setWindowModified( False )
 
-        if "Time\tTemperature\tPressure" == lines[0] :
-            # old style file
-            pass
+        for p in self.plots.values() :
+            p.clearZoomStack()
+
+        if self.ignoredChannels :
+            message += _tr(', no plot for %s') % ', '.join( sorted( self.ignoredChannels ) )
+        self.statusBar().showMessage( message )
 
-        #elif Time
 
     def saveAs( self ) :
         """Ask where to save and then call self.save() """
@@ -298,7 +537,7 @@ class BakeoutControllerWindow( Qt.QMainWindow ) :
             # ';'.join(map(str,list)) --> Functionnal way to convert all integer
             # item in list to string and join them with a comma.
             f.write( name + ' Time' + ';' )
-            f.write( ';'.join(map(str,self.plots.values()[0].x)) + '\n' )
+            f.write( ';'.join(map(str,plot.x)) + '\n' )
             f.write( name + ';' )
             f.write( ';'.join(map(str,plot.y))  + '\n' )
 
@@ -307,6 +546,15 @@ class BakeoutControllerWindow( Qt.QMainWindow ) :
         self.setWindowModified( False )
 
 
+    def autoSave( self ) :
+        """Append the samples received since the last autosave to the autosave file """
+
+        with PROFILER.stage( 'autosave' ) :
+            for w in self.autoSaveWriters :
+                w.write( self.unsavedSamples )
+        self.unsavedSamples = []
+
+
     def startMeasurement( self ) :
         """Start the timer on the plots """
 
@@ -352,19 +600,75 @@ class BakeoutControllerWindow( Qt.QMainWindow ) :
 
                 #  * 60000 to convert interval from [min] to [ms]
                 if self.autoSaveCheckBox.isChecked() :
-                    self.filename = 'bakeout_' + time.strftime('%Y-%m-%d-%H-%M',time.localtime()) + '.csv'
+                    if not self.autoSaveWriters :
+                        # New run, a paused one continues in the same files
+                        self.filename = 'bakeout_' + time.strftime('%Y-%m-%d-%H-%M',time.localtime()) + '.csv'
+                        filepath = os.path.join( str(self.autoSaveDirEdit.text()), self.filename)
+                        self.autoSaveWriters.append( RowWriter( filepath ) )
+
+                        if self.binaryLogCheckBox.isChecked() :
+                            self.autoSaveWriters.append( BinaryWriter( os.path.splitext( filepath )[0] ) )
+
+                        if self.rollupsCheckBox.isChecked() :
+                            self.autoSaveWriters.append( RollupWriter( os.path.splitext( filepath )[0] ) )
+
                     self.autoSaveTimer = self.startTimer(
                         self.autoSaveSpinBox.value() * 60000 )
 
-                interval = self.intervalSpinBox.value()
+                if self.streamCheckBox.isChecked() :
+                    self.startStream()
 
-                for p in self.plots.values() :
-                    p.initTimer( interval * 60000 )
+                if self.metricsCheckBox.isChecked() :
+                    self.startMetricsServer()
+
+                #  * 60 to convert interval from [min] to [s]
+                if self.adaptiveCheckBox.isChecked() :
+                    self.acquisition.start( self.intervalSpinBox.value() * 60,
+                        self.minIntervalSpinBox.value(), self.toleranceSpinBox.value() / 100. )
+                else :
+                    self.acquisition.start( self.intervalSpinBox.value() * 60 )
+                self.collectTimer = self.startTimer( 200 )
 
                 self.statusBar().showMessage( _tr('Measuring') )
                 self.setWindowModified( True )
 
 
+    def startStream( self ) :
+        """Start publishing the samples on the local port, once for all """
+
+        if self.stream is not None :
+            return
+
+        try :
+            self.stream = StreamServer( self.streamPortSpinBox.value() )
+        except socket.error :
+            Qt.QMessageBox.warning( self, _tr( "Streaming error" ), _tr( "Cannot stream on port %i :\n\n%s" ) % ( self.streamPortSpinBox.value(), sys.exc_info()[1] ), Qt.QMessageBox.Ok )
+            return
+
+        self.stream.start()
+        self.acquisition.addListener( self.stream.publish )
+        self.streamCheckBox.setEnabled( False )
+        self.streamPortSpinBox.setEnabled( False )
+
+
+    def startMetricsServer( self ) :
+        """Start serving the metrics of the devices on the local port, once for all """
+
+        if self.metricsServer is not None :
+            return
+
+        try :
+            self.metricsServer = metrics.MetricsServer( [ ( name, p.device ) for name, p in sorted( self.plots.items() ) ],
+                self.metricsPortSpinBox.value() )
+        except socket.error :
+            Qt.QMessageBox.warning( self, _tr( "Metrics error" ), _tr( "Cannot serve the metrics on port %i :\n\n%s" ) % ( self.metricsPortSpinBox.value(), sys.exc_info()[1] ), Qt.QMessageBox.Ok )
+            return
+
+        self.metricsServer.start()
+        self.metricsCheckBox.setEnabled( False )
+        self.metricsPortSpinBox.setEnabled( False )
+
+
     def clearMeasurement( self ) :
         """Set the clear plot to true for next run and kill the timer on the plots """
 
@@ -376,9 +680,11 @@ class BakeoutControllerWindow( Qt.QMainWindow ) :
         self.startAct.setChecked( False )
         self.pauseAct.setChecked( False )
 
-        for p in self.plots.values() :
-            p.stopTimer()
-            p.disconnect()
+        self.stopAcquisition()
+
+        for w in self.autoSaveWriters :
+            w.close()
+        self.autoSaveWriters = []
 
 
     def pauseMeasurement( self ) :
@@ -393,9 +699,7 @@ class BakeoutControllerWindow( Qt.QMainWindow ) :
             self.startAct.setChecked( False )
             self.configDock.setEnabled( True )
 
-            for p in self.plots.values() :
-                p.stopTimer()
-                p.disconnect()
+            self.stopAcquisition()
 
             self.statusBar().showMessage( _tr('Paused') )
 
@@ -404,29 +708,155 @@ class BakeoutControllerWindow( Qt.QMainWindow ) :
             self.pauseAct.setChecked( False )
 
 
-    def setInterval( self ) :
-        """Inform the plots of the new interval """
+    def stopAcquisition( self ) :
+        """Stop the acquisition threads, keep the last samples and disconnect """
+
+        self.acquisition.stop()
+
+        if self.collectTimer :
+            self.killTimer( self.collectTimer )
+            self.collectTimer = None
+        self.collectSamples()
+
+        if self.autoSaveTimer :
+            self.killTimer( self.autoSaveTimer )
+            self.autoSaveTimer = None
+            self.autoSave()
+
+        for p in self.plots.values() :
+            p.disconnect()
+
+
+    def collectSamples( self ) :
+        """Add the samples read by the acquisition threads to the plots """
+
+        with PROFILER.stage( 'collect' ) :
+            samples = self.acquisition.samples()
+
+            for name, t, value in samples :
+                self.plots[name].addSample( t, value )
+
+        if self.autoSaveWriters :
+            self.unsavedSamples.extend( samples )
+
+        self.showBusStatistics()
+        self.showDiagnostics()
+
+
+    def showBusStatistics( self ) :
+        """Display the time used by the last polling cycle on each serial bus """
+
+        self.busLabel.setText( ', '.join( [
+            _tr('%s: %i dev. %.2f s (%.1f %%)') % ( name, n, cycleTime, utilization * 100 )
+            for name, n, cycleTime, utilization in self.acquisition.busStatistics() ] ) )
+        ticks, meanJitter, maxJitter, missed = self.acquisition.clockStatistics()
+        self.busLabel.setToolTip( '\n'.join(
+            [ _tr('Jitter %.1f ms mean, %.1f ms max, %i missed deadline(s) in %i polls') % (
+                meanJitter * 1e3, maxJitter * 1e3, missed, ticks ) ] +
+            [ _tr('%s: every %.1f s') % ( name, interval )
+                for name, interval in sorted( self.acquisition.intervals().items() ) ] ) )
+
+
+    def setHistoryLength( self ) :
+        """Inform the plots of the maximum number of samples to keep """
 
         for p in self.plots.values() :
-            p.setInterval( self.intervalSpinBox.value() )
+            p.setHistoryLength( self.historySpinBox.value() )
+
+
+    def setMaxFps( self ) :
+        """Inform the redraw scheduler of the new maximum frame rate """
+
+        self.redraw.setMaxFps( self.fpsSpinBox.value() )
+
+
+    def showRedrawCost( self, cost ) :
+        """Display the time spent in the last repaint of the plots """
+
+        self.redrawLabel.setText( _tr('Redraw %.1f ms (avg. %.1f ms)') %
+            ( cost * 1000, self.redraw.averageCost * 1000 ) )
+
+
+    def showEvent( self, e ) :
+        """Repaint the plots which got data while the window was hidden """
+
+        Qt.QMainWindow.showEvent( self, e )
+        self.redraw.wake()
+
+
+    def changeEvent( self, e ) :
+        """Repaint the plots which got data while the window was minimized """
+
+        Qt.QMainWindow.changeEvent( self, e )
+        if e.type() == Qt.QEvent.WindowStateChange :
+            self.redraw.wake()
+
+
+    def showStall( self, event, duration, stage, stageDuration ) :
+        """Display an event loop stall found by the profiler """
+
+        self.statusBar().showMessage( _tr('Stall of %.0f ms in %s, %.0f ms in %s') % (
+            duration * 1e3, event, stageDuration * 1e3, stage ), 5000 )
+
+
+    def showProfileReport( self ) :
+        """Display the percentiles of the profiled stages """
+
+        box = Qt.QMessageBox( Qt.QMessageBox.Information, _tr('Profile report'), _tr('Durations in ms'), Qt.QMessageBox.Ok, self )
+        box.setDetailedText( PROFILER.report() )
+        box.exec_()
+
+
+    def dumpProfileTrace( self ) :
+        """Write the profiler trace, to open in chrome://tracing """
+
+        filename = Qt.QFileDialog.getSaveFileName( self, _tr('Dump profile trace'), 'profile.json', _tr('Trace (*.json)') )
+        if not filename.isEmpty() :
+            PROFILER.dump( str( filename ) )
 
 
     def timerEvent( self, e ) :
         """This method is called after a startTimer occured it will save
-        the measured value at regular interval.
+        the measured value at regular interval, or collect the new samples.
         """
 
-        filepath = os.path.join( str(self.autoSaveDirEdit.text()), self.filename)
+        with PROFILER.event( 'timer' ) :
+            if e.timerId() == self.collectTimer :
+                self.collectSamples()
+                return
+
+            if e.timerId() == self.loadTimer :
+                self.loadChunk()
+                return
 
-        self.save( filepath )
-        self.setWindowModified( True )
+            self.autoSave()
+            self.setWindowModified( True )
 
 
 #Only start an application if we are __main__
 if __name__ == '__main__':
 
+    parser = OptionParser(usage="usage: %prog [options] [Qt options]")
+    parser.add_option("-s", "--setup", type="choice", choices=sorted( config.SETUPS ),
+        default=config.DEFAULT_SETUP, dest="setup",
+        help="Lab setup, one of: " + ', '.join( sorted( config.SETUPS ) ) + " [default: %default]")
+    parser.add_option("--startup-report", action="store_true", default=False, dest="startupReport",
+        help="Print the time spent to start the program")
+    parser.add_option("--profile", action="store_true", default=False, dest="profile",
+        help="Time the stages of the event loop, see the Configuration menu")
+    parser.add_option("--stall", type="float", default=100, dest="stall",
+        help="Duration of an event reported as a stall by --profile, in ms [default: %default]")
+
+    # Qt takes its own options first, i.e. -style plastique, and leaves ours
     app = Qt.QApplication( sys.argv )
+    (options, args) = parser.parse_args( [ unicode( a ) for a in app.arguments() ][ 1 : ] )
+
+    if options.profile :
+        PROFILER.enable( options.stall / 1e3 )
+
     Qt.QObject.connect( app, Qt.SIGNAL("lastWindowClosed()"), app, Qt.SLOT("quit()") )
-    mainWindow = BakeoutControllerWindow()
+    mainWindow = BakeoutControllerWindow( options.setup )
     mainWindow.show()
+    if options.startupReport :
+        print mainWindow.startupReport()
     sys.exit( app.exec_() )